@@ -0,0 +1,63 @@
+# backend/bench_order_queries.py
+"""
+Compare the find-based and aggregation-based admin order queries.
+Runs read-only against the database in MONGODB_URI, from the backend directory:
+
+    python bench_order_queries.py --runs 20 --limit 100
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from routers.orders import (
+    find_admin_orders,
+    aggregate_admin_orders,
+    iter_export_batches,
+    iter_export_batches_aggregated,
+)
+
+
+async def time_listing(fetch_orders, limit, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await fetch_orders({}, limit)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def time_export(iter_batches, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        async for orders, users_map, products_map in iter_batches({}):
+            pass
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name, timings):
+    print(
+        f"{name:<28} median {statistics.median(timings) * 1000:8.1f} ms"
+        f"   min {min(timings) * 1000:8.1f} ms   max {max(timings) * 1000:8.1f} ms"
+    )
+
+
+async def main(runs, limit):
+    print(f"Admin order listing, {limit} orders per page, {runs} runs")
+    report("find + $in", await time_listing(find_admin_orders, limit, runs))
+    report("aggregate + $lookup", await time_listing(aggregate_admin_orders, limit, runs))
+
+    print(f"Full export query, {runs} runs")
+    report("find + batched $in", await time_export(iter_export_batches, runs))
+    report("aggregate + $lookup", await time_export(iter_export_batches_aggregated, runs))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.runs, args.limit))
@@ -1,9 +1,13 @@
 import motor.motor_asyncio
+from pymongo import UpdateOne, UpdateMany, ReplaceOne, DeleteMany, ReturnDocument, ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 from os import environ
 import os
 from dotenv import load_dotenv
 from bson import ObjectId
-from datetime import datetime
+from datetime import datetime, timedelta
+from collections import defaultdict
+import math
 
 load_dotenv()
 
@@ -18,6 +22,49 @@ orders_collection = database.orders
 payment_settings_collection = database.payment_settings
 survey_products_collection = database.survey_products
 survey_responses_collection = database.survey_responses
+idempotency_keys_collection = database.idempotency_keys
+stats_daily_collection = database.stats_daily
+orders_archive_collection = database.orders_archive
+product_prices_collection = database.product_prices
+
+# Indexes ensured at startup: (collection, keys, options)
+# Unique where the code already treats the field as one-per-document
+REQUIRED_INDEXES = [
+    # Login, signup and admin user lookups
+    (users_collection, [("phone", ASCENDING)], {"unique": True}),
+    # One cart per user
+    (carts_collection, [("user_id", ASCENDING)], {"unique": True}),
+    # Order history, newest first
+    (orders_collection, [("user_id", ASCENDING), ("order_date", DESCENDING)], {}),
+    # Admin order listing filtered by status
+    (orders_collection, [("order_status", ASCENDING), ("order_date", DESCENDING)], {}),
+    # Unfiltered admin listing and export keyset on (order_date, _id)
+    (orders_collection, [("order_date", DESCENDING), ("_id", DESCENDING)], {}),
+    # Polling fallback of the order feed
+    (orders_collection, [("updated_at", ASCENDING), ("_id", ASCENDING)], {}),
+    # Archived orders are read by user history, export and the admin listing
+    (orders_archive_collection, [("user_id", ASCENDING), ("order_date", DESCENDING)], {}),
+    (orders_archive_collection, [("order_date", DESCENDING), ("_id", DESCENDING)], {}),
+    # Admin product listing, keyset on (sort field, _id)
+    (products_collection, [("name", ASCENDING), ("_id", ASCENDING)], {}),
+    (products_collection, [("price", ASCENDING), ("_id", ASCENDING)], {}),
+    (products_collection, [("stock_quantity", ASCENDING), ("_id", ASCENDING)], {}),
+    (products_collection, [("category", ASCENDING), ("_id", ASCENDING)], {}),
+    # Storefront price sort and price-range filters
+    (products_collection, [("status", ASCENDING), ("min_price", ASCENDING)], {}),
+    (products_collection, [("status", ASCENDING), ("max_price", ASCENDING)], {}),
+    # One price per product option
+    (product_prices_collection, [("product_id", ASCENDING), ("type", ASCENDING), ("size", ASCENDING)], {"unique": True}),
+    (product_prices_collection, [("type", ASCENDING), ("size", ASCENDING), ("price", ASCENDING)], {}),
+    # One survey response per mobile number
+    (survey_responses_collection, [("mobile", ASCENDING)], {"unique": True}),
+]
+
+# Stored responses for idempotent requests expire after a day
+IDEMPOTENCY_KEY_TTL_SECONDS = 24 * 60 * 60
+
+# Stock reservation tags older than this belong to checkouts that died
+STOCK_RESERVATION_TTL_SECONDS = 60 * 60
 
 
 # Helper functions to convert between MongoDB ObjectId and string
@@ -38,13 +85,219 @@ def serialize_list(docs):
     return [serialize_doc_id(doc) for doc in docs]
 
 
+# Product operations
+async def get_products_by_ids(product_ids):
+    # Fetch many products with a single $in query, keyed by string id
+    object_ids = {
+        get_object_id(product_id)
+        for product_id in product_ids
+        if product_id and ObjectId.is_valid(product_id)
+    }
+    if not object_ids:
+        return {}
+
+    products = await products_collection.find(
+        {"_id": {"$in": list(object_ids)}}
+    ).to_list(None)
+    return {product["id"]: product for product in serialize_list(products)}
+
+
+async def reserve_stock(quantities):
+    """
+    Decrement stock for {product_id: quantity} in one unordered bulk write.
+    Each update only applies while stock_quantity >= quantity and is tagged
+    with a reservation id, so a partial reservation can be released exactly.
+    Returns the reservation id, or None if any product ran out of stock.
+    """
+    if not quantities:
+        return None
+
+    reservation_id = ObjectId()
+    reservation = {"id": reservation_id, "at": datetime.utcnow()}
+    operations = [
+        UpdateOne(
+            {"_id": get_object_id(product_id), "stock_quantity": {"$gte": quantity}},
+            {
+                "$inc": {"stock_quantity": -quantity},
+                "$push": {"stock_reservations": reservation},
+            },
+        )
+        for product_id, quantity in quantities.items()
+    ]
+    result = await products_collection.bulk_write(operations, ordered=False)
+    if result.modified_count < len(operations):
+        await release_stock(quantities, reservation_id)
+        return None
+    return reservation_id
+
+
+async def release_stock(quantities, reservation_id):
+    # Only products still tagged with this reservation get their stock back
+    operations = [
+        UpdateOne(
+            {"_id": get_object_id(product_id), "stock_reservations.id": reservation_id},
+            {
+                "$inc": {"stock_quantity": quantity},
+                "$pull": {"stock_reservations": {"id": reservation_id}},
+            },
+        )
+        for product_id, quantity in quantities.items()
+    ]
+    await products_collection.bulk_write(operations, ordered=False)
+
+
+async def confirm_stock_reservation(quantities, reservation_id):
+    """
+    Drop this reservation's tags from the reserved products, along with any
+    tags a crashed checkout left behind. Tags only matter until the order is
+    saved or released, which takes far less than the cutoff.
+    """
+    product_ids = [get_object_id(product_id) for product_id in quantities]
+    stale_before = datetime.utcnow() - timedelta(seconds=STOCK_RESERVATION_TTL_SECONDS)
+    await products_collection.bulk_write(
+        [
+            UpdateMany(
+                {"_id": {"$in": product_ids}, "stock_reservations.id": reservation_id},
+                {"$pull": {"stock_reservations": {"id": reservation_id}}},
+            ),
+            UpdateMany(
+                {"_id": {"$in": product_ids}, "stock_reservations.at": {"$lt": stale_before}},
+                {"$pull": {"stock_reservations": {"at": {"$lt": stale_before}}}},
+            ),
+        ],
+        ordered=False,
+    )
+
+
+# Fields the derived prices are computed from
+PRICE_SOURCE_PROJECTION = {"price": 1, "has_price_options": 1, "price_options": 1}
+
+
+def parse_price(value):
+    # price_options are untyped, so a price may be any value; None if not a number
+    if isinstance(value, bool):
+        return None
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        return None
+    return price if math.isfinite(price) else None
+
+
+def option_prices(product):
+    # (type, size) -> option with a numeric price, the last option winning on duplicates
+    if not product.get("has_price_options"):
+        return {}
+    options = {}
+    for option in product.get("price_options") or []:
+        if not isinstance(option, dict):
+            continue
+        price = parse_price(option.get("price"))
+        if price is not None:
+            options[(option.get("type"), option.get("size"))] = {**option, "price": price}
+    return options
+
+
+def derived_price_fields(product):
+    """min_price and max_price over the price options, or the base price without them"""
+    prices = [option["price"] for option in option_prices(product).values()]
+    if not prices:
+        prices = [parse_price(product.get("price")) or 0]
+    return {"min_price": min(prices), "max_price": max(prices)}
+
+
+async def refresh_product_prices(product_ids):
+    """
+    Recompute min_price/max_price and the product_prices lookup for these
+    products after a write; ids of deleted products just drop their rows.
+    Rows are upserted in place and only stale ones deleted, so concurrent
+    refreshes of one product never collide on the unique index.
+    """
+    object_ids = [get_object_id(pid) for pid in product_ids if ObjectId.is_valid(str(pid))]
+    if not object_ids:
+        return
+
+    products = await products_collection.find(
+        {"_id": {"$in": object_ids}}, PRICE_SOURCE_PROJECTION
+    ).to_list(None)
+
+    product_updates, price_operations = [], []
+    current_options = {str(object_id): [] for object_id in object_ids}
+    for product in products:
+        product_id = str(product["_id"])
+        product_updates.append(
+            UpdateOne({"_id": product["_id"]}, {"$set": derived_price_fields(product)})
+        )
+        for (option_type, size), option in option_prices(product).items():
+            key = {"product_id": product_id, "type": option_type, "size": size}
+            row = {**key, "quantity": option.get("quantity"), "price": option["price"]}
+            price_operations.append(ReplaceOne(key, row, upsert=True))
+            current_options[product_id].append({"type": option_type, "size": size})
+
+    # Drop rows of options that no longer exist (all rows of deleted products)
+    for product_id, options in current_options.items():
+        stale = {"product_id": product_id}
+        if options:
+            stale["$nor"] = options
+        price_operations.append(DeleteMany(stale))
+
+    if product_updates:
+        await products_collection.bulk_write(product_updates, ordered=False)
+    await product_prices_collection.bulk_write(price_operations, ordered=False)
+
+
+async def refresh_all_product_prices(query=None, batch_size=500):
+    """
+    Refresh derived prices for every product matching query, in batches.
+    A batch that fails is retried one product at a time, so a single bad
+    document is logged and skipped instead of failing the whole run.
+    """
+    product_ids = await products_collection.distinct("_id", query or {})
+    refreshed = 0
+    for start in range(0, len(product_ids), batch_size):
+        batch = product_ids[start:start + batch_size]
+        try:
+            await refresh_product_prices(batch)
+            refreshed += len(batch)
+            continue
+        except Exception:
+            pass
+        for product_id in batch:
+            try:
+                await refresh_product_prices([product_id])
+                refreshed += 1
+            except Exception as e:
+                print(f"Price refresh failed for product {product_id}: {str(e)}")
+    return refreshed
+
+
+# User operations
+async def get_users_by_ids(user_ids):
+    # Fetch many users with a single $in query, keyed by string id
+    object_ids = {
+        get_object_id(user_id)
+        for user_id in user_ids
+        if user_id and ObjectId.is_valid(user_id)
+    }
+    if not object_ids:
+        return {}
+
+    users = await users_collection.find(
+        {"_id": {"$in": list(object_ids)}}, {"password": 0}
+    ).to_list(None)
+    return {user["id"]: user for user in serialize_list(users)}
+
+
 # Cart operations
 async def get_user_cart(user_id):
-    cart = await carts_collection.find_one({"user_id": user_id})
-    if not cart:
-        # Create empty cart if it doesn't exist
-        cart = {"user_id": user_id, "items": []}
-        await carts_collection.insert_one(cart)
+    # Create an empty cart if it doesn't exist; the unique index on
+    # user_id keeps concurrent first requests down to one cart
+    cart = await carts_collection.find_one_and_update(
+        {"user_id": user_id},
+        {"$setOnInsert": {"items": []}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
     return serialize_doc_id(cart)
 
 
@@ -128,6 +381,200 @@ async def clear_cart(user_id):
     await carts_collection.update_one({"user_id": user_id}, {"$set": {"items": []}})
 
 
+# Index operations
+async def ensure_indexes():
+    for collection, keys, options in REQUIRED_INDEXES:
+        try:
+            await collection.create_index(keys, **options)
+        except OperationFailure as e:
+            # Existing duplicates block a unique index; keep starting up
+            print(f"Could not create index {keys} on {collection.name}: {str(e)}")
+    await ensure_idempotency_indexes()
+
+
+async def get_index_usage():
+    """Per-index access counters since the last mongod restart"""
+    usage = []
+    names = await database.list_collection_names(filter={"name": {"$not": {"$regex": "^system\\."}}})
+    for name in sorted(names):
+        stats = await database[name].aggregate([{"$indexStats": {}}]).to_list(None)
+        for index in sorted(stats, key=lambda index: index["name"]):
+            usage.append(
+                {
+                    "collection": name,
+                    "name": index["name"],
+                    "key": dict(index["key"]),
+                    "ops": index["accesses"]["ops"],
+                    "since": index["accesses"]["since"],
+                }
+            )
+    return usage
+
+
+# Idempotency key operations
+async def ensure_idempotency_indexes():
+    await idempotency_keys_collection.create_index(
+        [("user_id", ASCENDING), ("key", ASCENDING)], unique=True
+    )
+    await idempotency_keys_collection.create_index(
+        "created_at", expireAfterSeconds=IDEMPOTENCY_KEY_TTL_SECONDS
+    )
+
+
+async def begin_idempotent_request(user_id, key, endpoint):
+    """
+    Return the stored record if this key was already used,
+    otherwise claim the key and return None.
+    """
+    record = await idempotency_keys_collection.find_one(
+        {"user_id": user_id, "key": key}
+    )
+    if record:
+        return record
+
+    try:
+        await idempotency_keys_collection.insert_one(
+            {
+                "user_id": user_id,
+                "key": key,
+                "endpoint": endpoint,
+                "response": None,
+                "created_at": datetime.utcnow(),
+            }
+        )
+    except DuplicateKeyError:
+        # A concurrent retry claimed the key first
+        return await idempotency_keys_collection.find_one(
+            {"user_id": user_id, "key": key}
+        )
+    return None
+
+
+async def save_idempotent_response(user_id, key, response):
+    await idempotency_keys_collection.update_one(
+        {"user_id": user_id, "key": key}, {"$set": {"response": response}}
+    )
+
+
+async def discard_idempotent_request(user_id, key):
+    await idempotency_keys_collection.delete_one({"user_id": user_id, "key": key})
+
+
+# Dashboard rollup operations
+
+# Fields the stats_daily rollup is computed from
+STATS_PROJECTION = {
+    "order_date": 1,
+    "order_status": 1,
+    "payment_status": 1,
+    "total_amount": 1,
+    "items.product_id": 1,
+    "items.quantity": 1,
+}
+
+
+def enum_value(value):
+    return getattr(value, "value", value)
+
+
+def order_stats_increments(order, sign):
+    """
+    Counters one order contributes to its day in stats_daily.
+    Cancelled orders are counted by status but not in revenue or units.
+    """
+    increments = {
+        "orders": sign,
+        f"order_status.{enum_value(order.get('order_status'))}": sign,
+        f"payment_status.{enum_value(order.get('payment_status'))}": sign,
+    }
+    if enum_value(order.get("order_status")) != "cancelled":
+        increments["revenue"] = sign * order.get("total_amount", 0)
+        for item in order.get("items", []):
+            key = f"units.{item['product_id']}"
+            increments[key] = increments.get(key, 0) + sign * item.get("quantity", 0)
+    return increments
+
+
+def stats_day(order_date):
+    return order_date.strftime("%Y-%m-%d")
+
+
+async def apply_order_stats(changes):
+    """
+    Apply (order, sign) pairs to stats_daily with one $inc per day.
+    Use sign 1 for an order as it now is and -1 for an order as it was.
+    """
+    per_day = defaultdict(lambda: defaultdict(int))
+    for order, sign in changes:
+        if not order or not order.get("order_date"):
+            continue
+        day = per_day[stats_day(order["order_date"])]
+        for key, value in order_stats_increments(order, sign).items():
+            day[key] += value
+
+    operations = []
+    for day, increments in per_day.items():
+        increments = {key: value for key, value in increments.items() if value}
+        if not increments:
+            continue
+        operations.append(
+            UpdateOne(
+                {"_id": day},
+                {
+                    "$inc": increments,
+                    "$setOnInsert": {"date": datetime.strptime(day, "%Y-%m-%d")},
+                },
+                upsert=True,
+            )
+        )
+    if operations:
+        await stats_daily_collection.bulk_write(operations, ordered=False)
+
+
+async def seed_order_stats():
+    """
+    Build stats_daily from every order if it is still empty, e.g. on the
+    first deploy. Each day is inserted whole and a day that already exists
+    is left alone, so workers seeding together do not add up their scans.
+    An order placed while a seed runs can still be missed or counted twice
+    on its day; /admin/stats/rebuild recounts from scratch if that matters.
+    """
+    if await stats_daily_collection.find_one({}, {"_id": 1}):
+        return 0
+
+    per_day = defaultdict(lambda: defaultdict(int))
+    order_count = 0
+    # Archived orders still count towards the dashboard
+    for collection in (orders_collection, orders_archive_collection):
+        async for order in collection.find({}, STATS_PROJECTION).batch_size(1000):
+            if not order.get("order_date"):
+                continue
+            day = per_day[stats_day(order["order_date"])]
+            for key, value in order_stats_increments(order, 1).items():
+                day[key] += value
+            order_count += 1
+
+    documents = []
+    for day, increments in per_day.items():
+        document = {"_id": day, "date": datetime.strptime(day, "%Y-%m-%d")}
+        for key, value in increments.items():
+            # "order_status.pending" -> {"order_status": {"pending": ...}}, as $inc stores it
+            field, _, counter = key.partition(".")
+            if counter:
+                document.setdefault(field, {})[counter] = value
+            else:
+                document[field] = value
+        documents.append(document)
+
+    if documents:
+        try:
+            await stats_daily_collection.insert_many(documents, ordered=False)
+        except BulkWriteError:
+            # Another worker, or a new order, created some of the days first
+            pass
+    return order_count
+
+
 # Payment settings operations
 async def get_payment_settings():
     settings = await payment_settings_collection.find_one({})
@@ -140,18 +587,22 @@ async def get_payment_settings():
             "ifsc_code": "IBKL0000490",
             "upi_id": "acdatar-3@okhdfcbank",
             "gpay_number": "9764814452",
+            "version": 1,
         }
         await payment_settings_collection.insert_one(default_settings)
-        return default_settings
+        return serialize_doc_id(default_settings)
     return serialize_doc_id(settings)
 
 
 async def update_payment_settings(settings_data):
+    # Bump the version so cached copies (ETags) are invalidated
     settings = await payment_settings_collection.find_one({})
     if settings:
-        await payment_settings_collection.update_one({}, {"$set": settings_data})
+        await payment_settings_collection.update_one(
+            {}, {"$set": settings_data, "$inc": {"version": 1}}
+        )
     else:
-        await payment_settings_collection.insert_one(settings_data)
+        await payment_settings_collection.insert_one({**settings_data, "version": 1})
     return await get_payment_settings()
 
 
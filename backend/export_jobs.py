@@ -0,0 +1,149 @@
+# backend/export_jobs.py
+
+import hashlib
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EXPORT_RESULTS_DIR = os.getenv("EXPORT_RESULTS_DIR", "export_results")
+# Finished jobs and result files are dropped this long after they were made
+EXPORT_JOB_RETENTION_HOURS = float(os.getenv("EXPORT_JOB_RETENTION_HOURS", "24"))
+
+# Job status values
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_EXPIRED = "expired"
+
+# In-process job registry: job id -> job, and filter key -> job id for deduplication
+export_jobs = {}
+export_jobs_by_key = {}
+
+
+def export_job_key(filter_query, export_format):
+    # Identical filters produce the same key regardless of dict ordering
+    raw = json.dumps(
+        {"filter": filter_query, "format": export_format}, sort_keys=True, default=str
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def get_or_create_export_job(filter_query, export_format, extension):
+    """
+    Return the job for this filter if one is queued, running or cached,
+    otherwise register a new pending job.
+    The second value tells the caller whether the job still has to be run.
+    """
+    prune_export_jobs()
+    key = export_job_key(filter_query, export_format)
+    job_id = export_jobs_by_key.get(key)
+    if job_id and export_jobs[job_id]["status"] != JOB_FAILED:
+        return export_jobs[job_id], False
+
+    date_range = filter_query.get("order_date", {})
+    job_id = uuid.uuid4().hex
+    job = {
+        "id": job_id,
+        "key": key,
+        "status": JOB_PENDING,
+        "processed": 0,
+        "total": 0,
+        "created_at": datetime.utcnow(),
+        "completed_at": None,
+        "error": None,
+        "format": export_format,
+        "start_date": date_range.get("$gte"),
+        "end_date": date_range.get("$lt"),
+        "path": os.path.join(EXPORT_RESULTS_DIR, f"{job_id}.{extension}"),
+    }
+    export_jobs[job["id"]] = job
+    export_jobs_by_key[key] = job["id"]
+    return job, True
+
+
+async def run_export_job(job, filter_query, process, count):
+    os.makedirs(EXPORT_RESULTS_DIR, exist_ok=True)
+    job["status"] = JOB_RUNNING
+    try:
+        job["total"] = await count(filter_query)
+
+        def on_progress(processed):
+            job["processed"] = processed
+
+        await process(filter_query, job["path"], on_progress)
+        # The job may have been invalidated while it was running
+        if job["status"] == JOB_RUNNING:
+            job["status"] = JOB_COMPLETED
+            job["completed_at"] = datetime.utcnow()
+        else:
+            remove_result_file(job)
+    except Exception as e:
+        print(f"Export job {job['id']} failed: {str(e)}")
+        job["status"] = JOB_FAILED
+        job["error"] = getattr(e, "detail", str(e))
+        remove_result_file(job)
+
+
+def invalidate_export_cache(order_dates):
+    """Expire every export whose date range contains one of the changed orders"""
+    for job in list(export_jobs.values()):
+        if job["status"] in (JOB_FAILED, JOB_EXPIRED):
+            continue
+        if not any(job_covers_date(job, order_date) for order_date in order_dates):
+            continue
+
+        if export_jobs_by_key.get(job["key"]) == job["id"]:
+            del export_jobs_by_key[job["key"]]
+        if job["status"] == JOB_COMPLETED:
+            remove_result_file(job)
+        job["status"] = JOB_EXPIRED
+
+
+def prune_export_jobs():
+    """
+    Forget finished jobs older than the retention and delete result files
+    as old, including files a previous process left behind on restart.
+    """
+    cutoff = datetime.utcnow() - timedelta(hours=EXPORT_JOB_RETENTION_HOURS)
+    for job in list(export_jobs.values()):
+        if job["status"] in (JOB_PENDING, JOB_RUNNING) or job["created_at"] >= cutoff:
+            continue
+        if export_jobs_by_key.get(job["key"]) == job["id"]:
+            del export_jobs_by_key[job["key"]]
+        del export_jobs[job["id"]]
+        remove_result_file(job)
+
+    # Other workers share the directory, so only files past the retention go
+    if not os.path.isdir(EXPORT_RESULTS_DIR):
+        return
+    oldest_mtime = time.time() - EXPORT_JOB_RETENTION_HOURS * 60 * 60
+    for name in os.listdir(EXPORT_RESULTS_DIR):
+        path = os.path.join(EXPORT_RESULTS_DIR, name)
+        try:
+            if os.path.isfile(path) and os.path.getmtime(path) < oldest_mtime:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def job_covers_date(job, order_date):
+    if order_date is None:
+        return True
+    if job["start_date"] and order_date < job["start_date"]:
+        return False
+    if job["end_date"] and order_date >= job["end_date"]:
+        return False
+    return True
+
+
+def remove_result_file(job):
+    try:
+        os.remove(job["path"])
+    except FileNotFoundError:
+        pass
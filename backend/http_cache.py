@@ -0,0 +1,39 @@
+# backend/http_cache.py
+
+import hashlib
+from typing import Optional
+from fastapi import Response, status
+
+# Storefront catalog: browsers may reuse a copy for as long as the server cache does
+PRODUCTS_CACHE_CONTROL = "public, max-age=60, must-revalidate"
+# Payment details must always be revalidated, but a 304 is enough when unchanged
+PAYMENT_SETTINGS_CACHE_CONTROL = "public, no-cache"
+
+
+def make_etag(*parts) -> str:
+    raw = b"|".join(part if isinstance(part, bytes) else str(part).encode() for part in parts)
+    return f'"{hashlib.sha256(raw).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+def cache_headers(etag: str, cache_control: str):
+    return {"ETag": etag, "Cache-Control": cache_control}
+
+
+def conditional_json_response(
+    body: bytes, etag: str, if_none_match: Optional[str], cache_control: str
+) -> Response:
+    """Send a pre-encoded JSON body, or a bare 304 if the client already has it"""
+    headers = cache_headers(etag, cache_control)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
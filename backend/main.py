@@ -1,6 +1,12 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routers import auth, products, cart, orders, payment_settings, survey
+from routers import auth, products, cart, orders, payment_settings, survey, stats, order_events
+from database import ensure_indexes, seed_order_stats, refresh_all_product_prices
+from order_archive import archive_orders_periodically, ORDER_ARCHIVE_INTERVAL_HOURS
+from product_search import rebuild_search_index, rebuild_search_index_periodically
+from product_images import CachedStaticFiles, shutdown_image_pool, PRODUCT_IMAGES_DIR
+from export_jobs import prune_export_jobs
+import asyncio
 import uvicorn
 import requests
 import time
@@ -19,6 +25,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
@@ -28,6 +35,59 @@ app.include_router(cart.router, prefix="", tags=["cart"])
 app.include_router(orders.router, prefix="", tags=["orders"])
 app.include_router(payment_settings.router, prefix="", tags=["payment"])
 app.include_router(survey.router, prefix="", tags=["survey"])
+app.include_router(stats.router, prefix="", tags=["stats"])
+app.include_router(order_events.router, prefix="", tags=["orders"])
+
+# Uploaded product images and their thumbnails
+os.makedirs(PRODUCT_IMAGES_DIR, exist_ok=True)
+app.mount("/images", CachedStaticFiles(directory=PRODUCT_IMAGES_DIR), name="product_images")
+
+
+@app.on_event("startup")
+async def create_indexes():
+    await ensure_indexes()
+
+
+@app.on_event("startup")
+async def seed_dashboard_stats():
+    # The dashboard reads stats_daily, which starts empty on a new deploy
+    seeded = await seed_order_stats()
+    if seeded:
+        print(f"Seeded dashboard stats from {seeded} orders")
+
+
+@app.on_event("startup")
+async def backfill_product_prices():
+    # Price sort and filters read min_price/max_price, which older products lack
+    backfilled = await refresh_all_product_prices(
+        {"$or": [{"min_price": {"$exists": False}}, {"max_price": {"$exists": False}}]}
+    )
+    if backfilled:
+        print(f"Backfilled prices on {backfilled} products")
+
+
+@app.on_event("startup")
+async def clean_export_results():
+    # Export jobs live in memory; result files orphaned by a restart are
+    # deleted here and on later job creation once past the retention
+    prune_export_jobs()
+
+
+@app.on_event("startup")
+async def start_order_archival():
+    if ORDER_ARCHIVE_INTERVAL_HOURS > 0:
+        app.state.order_archival = asyncio.create_task(archive_orders_periodically())
+
+
+@app.on_event("startup")
+async def build_search_index():
+    await rebuild_search_index()
+    app.state.search_index_rebuild = asyncio.create_task(rebuild_search_index_periodically())
+
+
+@app.on_event("shutdown")
+async def stop_image_pool():
+    shutdown_image_pool()
 
 
 # GET route at the root URL
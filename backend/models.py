@@ -78,6 +78,7 @@ class ProductBase(BaseModel):
     is_seasonal: bool = False
     price_options: Optional[List[Dict[str, Any]]] = None
     has_price_options: bool = False
+    image_thumbnails: Optional[Dict[str, str]] = None  # Width -> WebP URL
 
 
 class ProductCreate(ProductBase):
@@ -96,10 +97,70 @@ class ProductUpdate(BaseModel):
     is_seasonal: Optional[bool] = None
     price_options: Optional[List[Dict[str, Any]]] = None
     has_price_options: Optional[bool] = None
+    image_thumbnails: Optional[Dict[str, str]] = None
 
 
 class ProductResponse(ProductBase):
     id: str
+    # Derived at write time from price or price_options
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+
+
+# Slim listing for grid views: no description or price options
+class ProductCardResponse(BaseModel):
+    id: str
+    name: str
+    price: float
+    old_price: Optional[float] = None
+    image_url: str
+    category: str
+    stock_quantity: int
+    status: str
+    is_seasonal: bool = False
+    has_price_options: bool = False
+    image_thumbnails: Optional[Dict[str, str]] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+
+
+class ProductSearchResult(BaseModel):
+    id: str
+    name: str
+    category: str
+    image_url: str
+    price: float
+
+
+class ProductImageResponse(BaseModel):
+    id: str
+    image_url: str  # Largest thumbnail, for the product's image_url
+    original_url: str
+    image_thumbnails: Dict[str, str]
+
+
+class ProductImportRowResult(BaseModel):
+    row: int  # Spreadsheet row number, the header being row 1
+    status: str  # created, updated, valid (dry run) or error
+    id: Optional[str] = None
+    errors: List[str] = []
+
+
+class ProductImportReport(BaseModel):
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
+    dry_run: bool = False
+    rows: List[ProductImportRowResult]
+
+
+class ProductBatchRequest(BaseModel):
+    ids: List[str]
+
+
+class ProductBatchResponse(BaseModel):
+    products: List[ProductResponse]  # In the order requested
+    missing: List[str] = []
 
 
 # Use Dict for the selected_option instead of a nested model to avoid serialization issues
@@ -150,8 +211,18 @@ class OrderCreate(BaseModel):
     payment_method: Optional[str] = "bank"
 
 
+class ProductSnapshot(BaseModel):
+    name: str
+    image_url: str
+    category: str
+
+
+class OrderProductResponse(ProductSnapshot):
+    id: str
+
+
 class OrderItemResponse(OrderItemBase):
-    product: ProductResponse
+    product: OrderProductResponse
 
 
 class OrderResponse(BaseModel):
@@ -181,6 +252,10 @@ class OrderUpdate(BaseModel):
     items: Optional[List[OrderItem]] = None
 
 
+class OrderPatch(OrderUpdate):
+    id: str
+
+
 class AdminOrderCreate(BaseModel):
     user_id: str
     delivery_address: str
@@ -211,7 +286,7 @@ class PaymentSettingsResponse(PaymentSettingsBase):
 
 
 class OrderExportRequest(BaseModel):
-    format: str = "excel"  # Default to excel
+    format: str = "excel"  # excel, csv, ndjson or parquet
     start_date: Optional[datetime] = None
     end_date: Optional[datetime] = None
     include_all_fields: bool = True
@@ -220,6 +295,43 @@ class OrderExportRequest(BaseModel):
     )
 
 
+class ExportJobResponse(BaseModel):
+    id: str
+    status: str  # pending, running, completed, failed, expired
+    processed: int = 0
+    total: int = 0
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+    error: Optional[str] = None
+    download_url: Optional[str] = None
+
+
+class DailyStats(BaseModel):
+    date: str
+    orders: int = 0
+    revenue: float = 0
+    order_status: Dict[str, int] = {}
+    payment_status: Dict[str, int] = {}
+    units: Dict[str, int] = {}
+
+
+class StatsResponse(BaseModel):
+    orders: int = 0
+    revenue: float = 0
+    order_status: Dict[str, int] = {}
+    payment_status: Dict[str, int] = {}
+    units: Dict[str, int] = {}
+    days: List[DailyStats] = []
+
+
+class IndexUsage(BaseModel):
+    collection: str
+    name: str
+    key: Dict[str, Any]
+    ops: int
+    since: datetime
+
+
 class SurveyProductOption(BaseModel):
     product_name: str
     quantity: str
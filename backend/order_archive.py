@@ -0,0 +1,153 @@
+# backend/order_archive.py
+
+import asyncio
+import heapq
+import os
+from datetime import datetime, timedelta
+from pymongo import ReplaceOne, DeleteOne
+from dotenv import load_dotenv
+
+from models import OrderStatus
+from database import orders_collection, orders_archive_collection, enum_value
+
+load_dotenv()
+
+# Delivered or cancelled orders older than this move to orders_archive
+ORDER_ARCHIVE_AFTER_DAYS = int(os.getenv("ORDER_ARCHIVE_AFTER_DAYS", "180"))
+# How often the archival job runs; 0 disables it
+ORDER_ARCHIVE_INTERVAL_HOURS = float(os.getenv("ORDER_ARCHIVE_INTERVAL_HOURS", "24"))
+ORDER_ARCHIVE_BATCH_SIZE = 500
+
+ARCHIVED_STATUSES = [OrderStatus.DELIVERED.value, OrderStatus.CANCELLED.value]
+
+
+async def archive_orders(older_than_days: int = ORDER_ARCHIVE_AFTER_DAYS):
+    """
+    Move finished orders older than the cutoff into orders_archive, one batch
+    at a time. Copies are upserted first and an order is only deleted if it
+    did not change in between, so an interrupted run can simply be repeated.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    query = {"order_status": {"$in": ARCHIVED_STATUSES}, "order_date": {"$lt": cutoff}}
+
+    archived = 0
+    while True:
+        orders = (
+            await orders_collection.find(query)
+            .sort("order_date", 1)
+            .limit(ORDER_ARCHIVE_BATCH_SIZE)
+            .to_list(ORDER_ARCHIVE_BATCH_SIZE)
+        )
+        if not orders:
+            break
+
+        await orders_archive_collection.bulk_write(
+            [ReplaceOne({"_id": order["_id"]}, order, upsert=True) for order in orders],
+            ordered=False,
+        )
+        result = await orders_collection.bulk_write(
+            [
+                DeleteOne({"_id": order["_id"], "updated_at": order.get("updated_at")})
+                for order in orders
+            ],
+            ordered=False,
+        )
+        archived += result.deleted_count
+
+        if result.deleted_count < len(orders):
+            # Orders updated since they were copied stay live; drop their copies
+            still_live = await orders_collection.distinct(
+                "_id", {"_id": {"$in": [order["_id"] for order in orders]}}
+            )
+            await orders_archive_collection.delete_many({"_id": {"$in": still_live}})
+            if result.deleted_count == 0:
+                break
+
+    return archived
+
+
+async def archive_orders_periodically():
+    while True:
+        try:
+            archived = await archive_orders()
+            if archived:
+                print(f"Archived {archived} orders")
+        except Exception as e:
+            print(f"Order archival failed: {str(e)}")
+        await asyncio.sleep(ORDER_ARCHIVE_INTERVAL_HOURS * 60 * 60)
+
+
+async def archive_needed(filter_query):
+    """Whether orders matching this (unwrapped) filter can be in the archive"""
+    order_status = filter_query.get("order_status")
+    if order_status is not None:
+        statuses = order_status.get("$in", []) if isinstance(order_status, dict) else [order_status]
+        if not {enum_value(s) for s in statuses} & set(ARCHIVED_STATUSES):
+            return False
+
+    # Everything in the archive is at most as new as its newest order
+    newest = await orders_archive_collection.find_one(
+        {}, {"order_date": 1}, sort=[("order_date", -1)]
+    )
+    if not newest:
+        return False
+    start_date = filter_query.get("order_date", {}).get("$gte")
+    return start_date is None or start_date <= newest["order_date"]
+
+
+async def find_order(filter_query):
+    """Find one order, falling back to the archive for older ones"""
+    order = await orders_collection.find_one(filter_query)
+    if not order:
+        order = await orders_archive_collection.find_one(filter_query)
+    return order
+
+
+async def restore_archived_orders(order_ids):
+    """
+    Move archived orders back to the live collection before an admin edits
+    them; the archival job moves them out again once they still qualify.
+    """
+    orders = await orders_archive_collection.find({"_id": {"$in": order_ids}}).to_list(None)
+    if not orders:
+        return 0
+
+    await orders_collection.bulk_write(
+        [ReplaceOne({"_id": order["_id"]}, order, upsert=True) for order in orders],
+        ordered=False,
+    )
+    await orders_archive_collection.delete_many({"_id": {"$in": [order["_id"] for order in orders]}})
+    return len(orders)
+
+
+async def merge_order_cursors(cursors, descending=False):
+    """Merge cursors that are each sorted on (order_date, _id) into one stream"""
+    iterators = [cursor.__aiter__() for cursor in cursors]
+    heap = []
+
+    async def push(index):
+        try:
+            order = await iterators[index].__anext__()
+        except StopAsyncIteration:
+            return
+        key = (order["order_date"], order["_id"])
+        heapq.heappush(heap, (Descending(key) if descending else key, index, order))
+
+    for index in range(len(iterators)):
+        await push(index)
+    while heap:
+        _, index, order = heapq.heappop(heap)
+        yield order
+        await push(index)
+
+
+class Descending:
+    # Inverts ordering so heapq pops the largest key first
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+    def __eq__(self, other):
+        return self.key == other.key
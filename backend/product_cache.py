@@ -0,0 +1,87 @@
+# backend/product_cache.py
+
+import os
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PRODUCT_CACHE_TTL_SECONDS = float(os.getenv("PRODUCT_CACHE_TTL_SECONDS", "60"))
+PRODUCT_CACHE_MAX_ENTRIES = int(os.getenv("PRODUCT_CACHE_MAX_ENTRIES", "256"))
+
+# In-process cache of storefront product reads: key -> (expires_at, value),
+# kept in least-recently-used order so the oldest entry is evicted first
+product_cache = OrderedDict()
+product_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+# Bumped on every invalidation so a read that started before a write
+# cannot put its stale result back into the cache
+product_cache_version = 0
+
+
+def product_cache_key(*parts):
+    return tuple(parts)
+
+
+def get_cached_products(key):
+    """Return (True, value) on a hit and (False, version) on a miss"""
+    entry = product_cache.get(key)
+    if entry and entry[0] > time.monotonic():
+        product_cache.move_to_end(key)
+        product_cache_stats["hits"] += 1
+        return True, entry[1]
+
+    if entry:
+        del product_cache[key]
+    product_cache_stats["misses"] += 1
+    return False, product_cache_version
+
+
+def set_cached_products(key, value, version):
+    # The catalog changed while this value was being read
+    if version != product_cache_version:
+        return
+
+    product_cache[key] = (time.monotonic() + PRODUCT_CACHE_TTL_SECONDS, value)
+    product_cache.move_to_end(key)
+    while len(product_cache) > PRODUCT_CACHE_MAX_ENTRIES:
+        product_cache.popitem(last=False)
+        product_cache_stats["evictions"] += 1
+
+
+async def cached_products(key, load):
+    """Return the cached value for key, calling load() on a miss"""
+    hit, value = get_cached_products(key)
+    if hit:
+        return value
+
+    version = value
+    value = await load()
+    if value is not None:
+        set_cached_products(key, value, version)
+    return value
+
+
+def invalidate_product_cache():
+    global product_cache_version
+    product_cache_version += 1
+    product_cache.clear()
+    product_cache_stats["invalidations"] += 1
+
+
+def evict_cached_products(keys):
+    # Drop just these entries; listings keep their copy until the TTL expires
+    for key in keys:
+        product_cache.pop(key, None)
+
+
+def get_product_cache_stats():
+    lookups = product_cache_stats["hits"] + product_cache_stats["misses"]
+    return {
+        **product_cache_stats,
+        "entries": len(product_cache),
+        "max_entries": PRODUCT_CACHE_MAX_ENTRIES,
+        "ttl_seconds": PRODUCT_CACHE_TTL_SECONDS,
+        "hit_rate": product_cache_stats["hits"] / lookups if lookups else 0,
+    }
@@ -0,0 +1,93 @@
+# backend/product_images.py
+
+import asyncio
+import io
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from fastapi.staticfiles import StaticFiles
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+load_dotenv()
+
+PRODUCT_IMAGES_DIR = os.getenv("PRODUCT_IMAGES_DIR", "product_images")
+PRODUCT_IMAGE_WORKERS = int(os.getenv("PRODUCT_IMAGE_WORKERS", "2"))
+PRODUCT_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+THUMBNAIL_WIDTHS = (160, 320, 640)
+THUMBNAIL_QUALITY = 80
+
+# File names are never reused, so clients may cache them forever
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Resizing is CPU bound, so it runs outside the event loop's process
+image_pool = None
+
+
+class CachedStaticFiles(StaticFiles):
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = IMAGE_CACHE_CONTROL
+        return response
+
+
+def get_image_pool():
+    global image_pool
+    if image_pool is None:
+        image_pool = ProcessPoolExecutor(max_workers=PRODUCT_IMAGE_WORKERS)
+    return image_pool
+
+
+def shutdown_image_pool():
+    global image_pool
+    if image_pool is not None:
+        image_pool.shutdown(wait=False, cancel_futures=True)
+        image_pool = None
+
+
+def save_product_image(content: bytes, image_id: str):
+    """
+    Store the original and write one WebP thumbnail per width (runs in the pool).
+    Returns the original's file name and {width: thumbnail file name}.
+    Raises ValueError if the upload is not an image Pillow can read.
+    """
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            image.verify()
+        image = Image.open(io.BytesIO(content))
+        image_format = (image.format or "").lower()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError):
+        raise ValueError("File is not a supported image")
+
+    original_name = f"{image_id}.{image_format or 'img'}"
+    with open(os.path.join(PRODUCT_IMAGES_DIR, "originals", original_name), "wb") as f:
+        f.write(content)
+
+    # Apply camera rotation before resizing so thumbnails are upright
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+    thumbnails = {}
+    for width in THUMBNAIL_WIDTHS:
+        resized = image
+        if width < image.width:
+            height = round(image.height * width / image.width)
+            resized = image.resize((width, height), Image.Resampling.LANCZOS)
+        name = f"{image_id}_{width}.webp"
+        resized.save(os.path.join(PRODUCT_IMAGES_DIR, name), "WEBP", quality=THUMBNAIL_QUALITY)
+        thumbnails[str(width)] = name
+        # Never upscale: small originals stop at their own width
+        if width >= image.width:
+            break
+    return original_name, thumbnails
+
+
+async def store_product_image(content: bytes):
+    os.makedirs(os.path.join(PRODUCT_IMAGES_DIR, "originals"), exist_ok=True)
+    image_id = uuid.uuid4().hex
+    loop = asyncio.get_running_loop()
+    original_name, thumbnails = await loop.run_in_executor(
+        get_image_pool(), save_product_image, content, image_id
+    )
+    return image_id, original_name, thumbnails
@@ -0,0 +1,148 @@
+# backend/product_search.py
+
+import asyncio
+import os
+import re
+from collections import defaultdict
+from dotenv import load_dotenv
+
+from database import products_collection, serialize_list
+
+load_dotenv()
+
+# Other workers' admin writes are picked up by a periodic full rebuild
+PRODUCT_SEARCH_REBUILD_SECONDS = float(os.getenv("PRODUCT_SEARCH_REBUILD_SECONDS", "300"))
+MAX_PREFIX_LENGTH = 15
+# Share of a query token's trigrams a word must contain to count as a fuzzy match
+MIN_TRIGRAM_SIMILARITY = 0.5
+
+# Matches in the name rank above the category, which ranks above the description
+FIELD_WEIGHTS = {"name": 3, "category": 2, "description": 1}
+SEARCH_RESULT_FIELDS = ["name", "category", "image_url", "price"]
+SEARCH_INDEX_PROJECTION = {
+    field: 1 for field in ["status", *FIELD_WEIGHTS, *SEARCH_RESULT_FIELDS]
+}
+
+# Inverted indexes: term -> {product id: best field weight}
+prefix_index = defaultdict(dict)
+trigram_index = defaultdict(dict)
+# product id -> search result fields, and the terms it was indexed under
+search_documents = {}
+document_terms = {}
+
+
+def tokenize(text):
+    return re.findall(r"[a-z0-9]+", (text or "").lower())
+
+
+def trigrams(token):
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def index_product(product):
+    """Add or refresh one serialized product; inactive products are dropped"""
+    remove_product(product["id"])
+    if product.get("status") != "active":
+        return
+
+    terms = {"prefix": set(), "trigram": set()}
+    for field, weight in FIELD_WEIGHTS.items():
+        for token in tokenize(product.get(field)):
+            for length in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1):
+                add_posting(prefix_index, token[:length], product["id"], weight)
+                terms["prefix"].add(token[:length])
+            for trigram in trigrams(token):
+                add_posting(trigram_index, trigram, product["id"], weight)
+                terms["trigram"].add(trigram)
+
+    search_documents[product["id"]] = {
+        "id": product["id"],
+        **{field: product.get(field) for field in SEARCH_RESULT_FIELDS},
+    }
+    document_terms[product["id"]] = terms
+
+
+def add_posting(index, term, product_id, weight):
+    postings = index[term]
+    postings[product_id] = max(weight, postings.get(product_id, 0))
+
+
+def remove_product(product_id):
+    terms = document_terms.pop(product_id, None)
+    search_documents.pop(product_id, None)
+    if not terms:
+        return
+    for index, kind in ((prefix_index, "prefix"), (trigram_index, "trigram")):
+        for term in terms[kind]:
+            postings = index.get(term)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            if not postings:
+                del index[term]
+
+
+async def rebuild_search_index():
+    products = await products_collection.find(
+        {"status": "active"}, SEARCH_INDEX_PROJECTION
+    ).to_list(None)
+
+    prefix_index.clear()
+    trigram_index.clear()
+    search_documents.clear()
+    document_terms.clear()
+    for product in serialize_list(products):
+        index_product(product)
+
+
+async def rebuild_search_index_periodically():
+    while True:
+        await asyncio.sleep(PRODUCT_SEARCH_REBUILD_SECONDS)
+        try:
+            await rebuild_search_index()
+        except Exception as e:
+            print(f"Product search index rebuild failed: {str(e)}")
+
+
+def score_token(token):
+    """Scores for one query token: prefix matches first, trigram overlap for typos"""
+    scores = dict(prefix_index.get(token[:MAX_PREFIX_LENGTH], {}))
+    if len(token) < 3:
+        return scores
+
+    query_trigrams = trigrams(token)
+    overlap = defaultdict(int)
+    for trigram in query_trigrams:
+        for product_id in trigram_index.get(trigram, {}):
+            overlap[product_id] += 1
+    for product_id, shared in overlap.items():
+        similarity = shared / len(query_trigrams)
+        if product_id not in scores and similarity >= MIN_TRIGRAM_SIMILARITY:
+            # Fuzzy matches rank below any prefix match in the same field
+            weight = max(trigram_index.get(t, {}).get(product_id, 0) for t in query_trigrams)
+            scores[product_id] = weight * similarity * 0.5
+    return scores
+
+
+def search_products(query, limit):
+    """Products matching every query token, best matches first"""
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+
+    totals = None
+    for token in tokens:
+        scores = score_token(token)
+        if totals is None:
+            totals = scores
+        else:
+            totals = {pid: totals[pid] + score for pid, score in scores.items() if pid in totals}
+        if not totals:
+            return []
+
+    ranked = sorted(
+        totals.items(),
+        key=lambda item: (-item[1], search_documents[item[0]]["name"] or ""),
+    )
+    return [search_documents[product_id] for product_id, _ in ranked[:limit]]
@@ -7,6 +7,7 @@ from typing import Optional, List
 import os
 from dotenv import load_dotenv
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 import csv
 import io
 import pandas as pd
@@ -78,8 +79,14 @@ async def create_user(user: UserCreate):
     user_dict["password"] = get_password_hash(user.password)
     user_dict["is_admin"] = False
 
-    # Insert user to database
-    result = await users_collection.insert_one(user_dict)
+    # Insert user to database; the unique phone index catches concurrent signups
+    try:
+        result = await users_collection.insert_one(user_dict)
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Phone number already registered",
+        )
     user_dict["id"] = str(result.inserted_id)
 
     # Remove password field from response
@@ -144,6 +151,14 @@ async def admin_login(login_data: LoginRequest):
 
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
+    return await get_token_user(token)
+
+
+async def get_token_user(token: str, scope: Optional[str] = None):
+    """
+    Resolve the user of a JWT. Scoped tokens only work where their scope is
+    expected, so a short-lived query string token is never a login token.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -153,7 +168,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
-        if user_id is None:
+        if user_id is None or payload.get("scope") != scope:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
@@ -192,10 +207,16 @@ async def update_user(
     if "password" in update_data:
         update_data["password"] = get_password_hash(update_data["password"])
 
-    # Update user
-    await users_collection.update_one(
-        {"_id": ObjectId(current_user.id)}, {"$set": update_data}
-    )
+    # Update user; the phone number may belong to someone else
+    try:
+        await users_collection.update_one(
+            {"_id": ObjectId(current_user.id)}, {"$set": update_data}
+        )
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Phone number already registered",
+        )
 
     # Get updated user
     updated_user = await users_collection.find_one({"_id": ObjectId(current_user.id)})
@@ -252,8 +273,14 @@ async def create_user_as_admin(
     user_dict["password"] = get_password_hash(user.password)
     user_dict["is_admin"] = is_admin
 
-    # Insert user to database
-    result = await users_collection.insert_one(user_dict)
+    # Insert user to database; the unique phone index catches concurrent signups
+    try:
+        result = await users_collection.insert_one(user_dict)
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Phone number already registered",
+        )
     user_dict["id"] = str(result.inserted_id)
 
     # Remove password field from response
@@ -293,8 +320,16 @@ async def update_user_as_admin(
     if "password" in update_data:
         update_data["password"] = get_password_hash(update_data["password"])
 
-    # Update user
-    await users_collection.update_one({"_id": ObjectId(user_id)}, {"$set": update_data})
+    # Update user; the phone number may belong to someone else
+    try:
+        await users_collection.update_one(
+            {"_id": ObjectId(user_id)}, {"$set": update_data}
+        )
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Phone number already registered",
+        )
 
     # Get updated user
     updated_user = await users_collection.find_one({"_id": ObjectId(user_id)})
@@ -0,0 +1,228 @@
+# backend/routers/order_events.py
+
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime, timedelta
+from pymongo.errors import OperationFailure
+import asyncio
+import base64
+import json
+import os
+import time
+
+from models import UserInDB
+from database import orders_collection
+from routers.auth import get_current_user, get_token_user, create_access_token
+
+router = APIRouter()
+
+ORDER_FEED_POLL_INTERVAL = float(os.getenv("ORDER_FEED_POLL_INTERVAL", "2"))
+ORDER_FEED_HEARTBEAT_SECONDS = 15
+ORDER_FEED_POLL_BATCH_SIZE = 100
+
+# EventSource cannot send an Authorization header, so the feed takes a
+# short-lived token in the query string; it is only checked on connect
+ORDER_STREAM_SCOPE = "order_stream"
+ORDER_STREAM_TOKEN_SECONDS = 60
+
+# Event ids from the polling fallback carry this prefix instead of a resume token
+POLL_EVENT_PREFIX = "poll:"
+
+ORDER_FEED_FIELDS = [
+    "user_id",
+    "order_date",
+    "delivery_address",
+    "receiver_phone",
+    "items",
+    "total_amount",
+    "order_status",
+    "payment_status",
+]
+
+
+@router.post("/admin/orders/stream-token")
+async def create_order_stream_token(current_user: UserInDB = Depends(get_current_user)):
+    # Check if user is admin
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized"
+        )
+
+    token = create_access_token(
+        data={"sub": current_user.id, "scope": ORDER_STREAM_SCOPE},
+        expires_delta=timedelta(seconds=ORDER_STREAM_TOKEN_SECONDS),
+    )
+    return {"token": token, "expires_in": ORDER_STREAM_TOKEN_SECONDS}
+
+
+@router.get("/admin/orders/stream")
+async def stream_orders(
+    request: Request,
+    token: str = Query(...),
+    last_event_id: Optional[str] = Header(None),
+    resume_from: Optional[str] = Query(None, alias="last_event_id"),
+):
+    """
+    Server-Sent Events feed of order inserts, updates and deletes.
+    Connect with ?token= from POST /admin/orders/stream-token, e.g.
+    new EventSource(`/admin/orders/stream?token=${token}`); fetch a new
+    token before reconnecting once it has expired.
+    Each event id is a change stream resume token; reconnecting with it in
+    Last-Event-ID, or ?last_event_id= on a new EventSource, replays what was
+    missed. Without change streams (standalone mongod) the feed polls on
+    updated_at instead and cannot report deletes.
+    """
+    current_user = await get_token_user(token, ORDER_STREAM_SCOPE)
+
+    # Check if user is admin
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized"
+        )
+
+    last_event_id = last_event_id or resume_from
+    if last_event_id and last_event_id.startswith(POLL_EVENT_PREFIX):
+        changes = poll_order_changes(decode_poll_position(last_event_id))
+    else:
+        changes = watch_order_changes(last_event_id)
+
+    return StreamingResponse(
+        order_events(request, changes),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def order_events(request: Request, changes):
+    # changes yields (event_id, data), or None when there was nothing new
+    last_sent = time.monotonic()
+    try:
+        async for change in changes:
+            if await request.is_disconnected():
+                break
+
+            if change is None:
+                if time.monotonic() - last_sent >= ORDER_FEED_HEARTBEAT_SECONDS:
+                    last_sent = time.monotonic()
+                    yield ": keepalive\n\n"
+                continue
+
+            event_id, data = change
+            last_sent = time.monotonic()
+            yield f"id: {event_id}\nevent: order\ndata: {json.dumps(data, default=json_default)}\n\n"
+    finally:
+        await changes.aclose()
+
+
+async def watch_order_changes(resume_token: Optional[str]):
+    pipeline = [
+        {"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}
+    ]
+    stream = orders_collection.watch(
+        pipeline,
+        resume_after={"_data": resume_token} if resume_token else None,
+        max_await_time_ms=ORDER_FEED_HEARTBEAT_SECONDS * 1000,
+    )
+    try:
+        # The first fetch opens the change stream on the server
+        change = await stream.try_next()
+    except OperationFailure:
+        await stream.close()
+        if resume_token:
+            # The token is unknown or too old: tell the client to reload
+            yield "", {"op": "reset"}
+            async for change in watch_order_changes(None):
+                yield change
+        else:
+            # Change streams need a replica set
+            async for change in poll_order_changes(None):
+                yield change
+        return
+
+    try:
+        while True:
+            if change is None:
+                yield None
+            else:
+                yield change["_id"]["_data"], compact_change(change)
+            change = await stream.try_next()
+    finally:
+        await stream.close()
+
+
+async def poll_order_changes(position):
+    # Keyset on (updated_at, _id) so no change is skipped or repeated
+    updated_at, last_id = position or (datetime.utcnow(), ObjectId("0" * 24))
+    while True:
+        orders = (
+            await orders_collection.find(
+                {
+                    "$or": [
+                        {"updated_at": {"$gt": updated_at}},
+                        {"updated_at": updated_at, "_id": {"$gt": last_id}},
+                    ]
+                }
+            )
+            .sort([("updated_at", 1), ("_id", 1)])
+            .limit(ORDER_FEED_POLL_BATCH_SIZE)
+            .to_list(ORDER_FEED_POLL_BATCH_SIZE)
+        )
+        if not orders:
+            yield None
+            await asyncio.sleep(ORDER_FEED_POLL_INTERVAL)
+            continue
+
+        for order in orders:
+            updated_at, last_id = order["updated_at"], order["_id"]
+            # Orders are created with updated_at equal to order_date
+            op = "insert" if order.get("order_date") == updated_at else "update"
+            yield encode_poll_position(updated_at, last_id), {"op": op, **compact_order(order)}
+
+
+def compact_change(change):
+    order_id = str(change["documentKey"]["_id"])
+    operation = change["operationType"]
+    if operation in ("insert", "replace"):
+        return {"op": operation, **compact_order(change["fullDocument"])}
+    if operation == "update":
+        description = change.get("updateDescription", {})
+        return {
+            "op": "update",
+            "id": order_id,
+            "fields": description.get("updatedFields", {}),
+            "removed": description.get("removedFields", []),
+        }
+    return {"op": "delete", "id": order_id}
+
+
+def compact_order(order):
+    compact = {"id": str(order["_id"])}
+    for field in ORDER_FEED_FIELDS:
+        if field in order:
+            compact[field] = order[field]
+    return compact
+
+
+def encode_poll_position(updated_at, order_id):
+    raw = f"{updated_at.isoformat()}|{order_id}"
+    return POLL_EVENT_PREFIX + base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_poll_position(event_id):
+    try:
+        raw = base64.urlsafe_b64decode(event_id[len(POLL_EVENT_PREFIX):].encode()).decode()
+        updated_at, order_id = raw.split("|")
+        return datetime.fromisoformat(updated_at), ObjectId(order_id)
+    except (ValueError, InvalidId):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Last-Event-ID"
+        )
+
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
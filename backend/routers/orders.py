@@ -1,11 +1,24 @@
 # backend/routers/orders.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, File, UploadFile, Form, Response
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, File, UploadFile, Form, Response, Query, Header
+from fastapi.encoders import jsonable_encoder
 from typing import List, Optional, Dict, Any
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError
+from pydantic import ValidationError
 from datetime import datetime, timedelta
+from fastapi.responses import StreamingResponse, FileResponse
+from starlette.background import BackgroundTask
+from tempfile import NamedTemporaryFile
+import base64
+import os
 import pandas as pd
-import io
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xlsxwriter
+from functools import partial
 from models import (
     OrderCreate,
     OrderResponse,
@@ -13,35 +26,80 @@ from models import (
     OrderStatus,
     PaymentStatus,
     UserInDB,
-    ProductResponse,
+    OrderProductResponse,
     OrderItemResponse,
     AdminOrderCreate,
     OrderItem,
+    OrderPatch,
+    CartItem,
     OrderExportRequest,
+    ExportJobResponse,
 )
 from database import (
     orders_collection,
-    products_collection,
     get_user_cart,
     clear_cart,
     serialize_doc_id,
     serialize_list,
     users_collection,
+    orders_archive_collection,
+    get_products_by_ids,
+    get_users_by_ids,
+    reserve_stock,
+    release_stock,
+    confirm_stock_reservation,
+    begin_idempotent_request,
+    save_idempotent_response,
+    discard_idempotent_request,
+    apply_order_stats,
+    STATS_PROJECTION,
+    enum_value,
 )
+from export_jobs import (
+    export_jobs,
+    get_or_create_export_job,
+    run_export_job,
+    invalidate_export_cache,
+    JOB_COMPLETED,
+)
+from order_archive import (
+    archive_orders,
+    archive_needed,
+    find_order,
+    merge_order_cursors,
+    restore_archived_orders,
+    ORDER_ARCHIVE_AFTER_DAYS,
+)
+from product_cache import product_cache_key, evict_cached_products
 from routers.auth import get_current_user
 
 router = APIRouter()
 
+ADMIN_ORDERS_PAGE_SIZE = 1000
+SNAPSHOT_BACKFILL_BATCH_SIZE = 500
+
 
 @router.post("/orders", response_model=OrderResponse)
 async def create_order(
     order_data: OrderCreate,
+    idempotency_key: Optional[str] = Header(None),
     current_user: UserInDB = Depends(get_current_user)
 ):
+    return await run_idempotent(
+        idempotency_key,
+        current_user.id,
+        "create_order",
+        lambda: place_order(order_data, current_user),
+    )
+
+
+async def place_order(order_data: OrderCreate, current_user: UserInDB):
     # Create new order
+    now = datetime.utcnow()
     order = {
         "user_id": current_user.id,
-        "order_date": datetime.utcnow(),
+        "order_date": now,
+        "updated_at": now,
         "delivery_address": order_data.delivery_address,
         "receiver_phone": order_data.receiver_phone,
         "items": [],
@@ -51,100 +109,51 @@ async def create_order(
         "payment_method": order_data.payment_method or "bank",
     }
 
-    # Process order items
-    items = []
-    total_amount = 0
-
-    for item in order_data.items:
-        # Get product details
-        product = await products_collection.find_one({"_id": ObjectId(item.product_id)})
-        if not product:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Product with id {item.product_id} not found",
-            )
-
-        # Check if product is active and has sufficient stock
-        if product.get("status", "active") != "active":
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Product '{product['name']}' is not available for purchase",
-            )
-
-        if item.quantity > product.get("stock_quantity", 0):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Insufficient stock for '{product['name']}'. Available: {product.get('stock_quantity', 0)}",
-            )
-
-        # Update product stock
-        await products_collection.update_one(
-            {"_id": ObjectId(item.product_id)},
-            {"$inc": {"stock_quantity": -item.quantity}},
-        )
-
-        product = serialize_doc_id(product)
-
-        # Determine price based on selected option
-        item_price = product["price"]
-        selected_option = None
-        
-        if item.selected_option:
-            # No need to call .dict() since it's already a dict
-            selected_option = item.selected_option
-            item_price = selected_option["price"]
-
-        # Add item to order
-        order_item = {
-            "product_id": item.product_id,
-            "quantity": item.quantity,
-            "price_at_purchase": item_price,
-        }
-        
-        if selected_option:
-            order_item["selected_option"] = selected_option
-
-        items.append(order_item)
-        total_amount += item_price * item.quantity
+    # Validate items against products fetched in one query
+    products_map = await get_products_by_ids(
+        [item.product_id for item in order_data.items]
+    )
+    items, total_amount, quantities = prepare_order_items(order_data.items, products_map)
 
     order["items"] = items
     order["total_amount"] = total_amount
 
-    # Save order to database
-    result = await orders_collection.insert_one(order)
-    order["id"] = str(result.inserted_id)
+    # Reserve stock and save the order
+    await save_order_with_stock(order, quantities, products_map)
 
     # Clear user's cart
     await clear_cart(current_user.id)
 
-    # Format response
-    order_response = await get_order_with_products(order["id"])
+    # Format response from the products already in hand
+    order_response = await format_order_response(order, products_map)
     return order_response
 
 @router.get("/orders", response_model=List[OrderResponse])
 async def get_user_orders(current_user: UserInDB = Depends(get_current_user)):
-    orders = (
-        await orders_collection.find({"user_id": current_user.id})
-        .sort("order_date", -1)
-        .to_list(1000)
-    )
+    filter_query = {"user_id": current_user.id}
+    collections = [orders_collection]
+    # Older finished orders live in the archive
+    if await archive_needed(filter_query):
+        collections.append(orders_archive_collection)
+    cursors = [
+        collection.find(filter_query).sort([("order_date", -1), ("_id", -1)]).limit(1000)
+        for collection in collections
+    ]
+    orders = []
+    async for order in merge_order_cursors(cursors, descending=True):
+        orders.append(order)
+        if len(orders) >= 1000:
+            break
     orders = serialize_list(orders)
 
-    # Format response with product details
-    order_responses = []
-    for order in orders:
-        order_with_products = await format_order_response(order)
-        order_responses.append(order_with_products)
-
-    return order_responses
+    # Format response with product details fetched in one batch
+    return await format_order_responses(orders)
 
 
 @router.get("/orders/{order_id}", response_model=OrderResponse)
 async def get_order(order_id: str, current_user: UserInDB = Depends(get_current_user)):
-    # Get order
-    order = await orders_collection.find_one(
-        {"_id": ObjectId(order_id), "user_id": current_user.id}
-    )
+    # Get order, falling back to the archive for older ones
+    order = await find_order({"_id": ObjectId(order_id), "user_id": current_user.id})
 
     if not order:
         raise HTTPException(
@@ -159,10 +168,21 @@ async def get_order(order_id: str, current_user: UserInDB = Depends(get_current_
 
 @router.post("/orders/{order_id}/repeat", response_model=OrderResponse)
 async def repeat_order(
-    order_id: str, current_user: UserInDB = Depends(get_current_user)
+    order_id: str,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: UserInDB = Depends(get_current_user),
 ):
-    # Get original order
-    original_order = await orders_collection.find_one(
+    return await run_idempotent(
+        idempotency_key,
+        current_user.id,
+        f"repeat_order:{order_id}",
+        lambda: place_repeat_order(order_id, current_user),
+    )
+
+
+async def place_repeat_order(order_id: str, current_user: UserInDB):
+    # Get original order, which may already be archived
+    original_order = await find_order(
         {"_id": ObjectId(order_id), "user_id": current_user.id}
     )
 
@@ -171,24 +191,36 @@ async def repeat_order(
             status_code=status.HTTP_404_NOT_FOUND, detail="Order not found"
         )
 
+    # Re-price the original items at today's prices and options
+    products_map = await get_products_by_ids(
+        [item["product_id"] for item in original_order.get("items", [])]
+    )
+    cart_items = [
+        repeat_cart_item(item, products_map.get(item["product_id"]))
+        for item in original_order.get("items", [])
+    ]
+    items, total_amount, quantities = prepare_order_items(cart_items, products_map)
+
     # Create new order based on the original
+    now = datetime.utcnow()
     new_order = {
         "user_id": current_user.id,
-        "order_date": datetime.utcnow(),
+        "order_date": now,
+        "updated_at": now,
         "delivery_address": original_order["delivery_address"],
         "receiver_phone": original_order["receiver_phone"],
-        "items": original_order["items"],  # This will include selected_option if present
-        "total_amount": original_order["total_amount"],
+        "items": items,
+        "total_amount": total_amount,
         "order_status": OrderStatus.PENDING,
         "payment_status": PaymentStatus.PENDING,
+        "payment_method": original_order.get("payment_method", "bank"),
     }
 
-    # Save new order to database
-    result = await orders_collection.insert_one(new_order)
-    new_order["id"] = str(result.inserted_id)
+    # Reserve stock and save the order, exactly as for a fresh checkout
+    await save_order_with_stock(new_order, quantities, products_map)
 
-    # Format response
-    order_response = await format_order_response(new_order)
+    # Format response from the products already in hand
+    order_response = await format_order_response(new_order, products_map)
 
     return order_response
 
@@ -198,18 +230,32 @@ async def repeat_order(
 
 @router.get("/admin/orders", response_model=List[OrderResponse])
 async def get_all_orders(
-    status: Optional[str] = None, current_user: UserInDB = Depends(get_current_user)
+    response: Response,
+    status_group: Optional[str] = Query(None, alias="status"),
+    order_status: Optional[OrderStatus] = None,
+    payment_status: Optional[PaymentStatus] = None,
+    user_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(ADMIN_ORDERS_PAGE_SIZE, ge=1, le=ADMIN_ORDERS_PAGE_SIZE),
+    current_user: UserInDB = Depends(get_current_user),
 ):
+    """
+    List orders newest first, one page at a time.
+    The cursor for the next page is returned in the X-Next-Cursor header
+    and is absent on the last page.
+    """
     # Check if user is admin
     if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized"
         )
 
-    # Filter by status if provided
+    # Filter by status group if provided
     filter_query = {}
-    if status:
-        if status == "active":
+    if status_group:
+        if status_group == "active":
             filter_query["order_status"] = {
                 "$in": [
                     OrderStatus.PENDING,
@@ -217,23 +263,83 @@ async def get_all_orders(
                     OrderStatus.SHIPPED,
                 ]
             }
-        elif status == "past":
+        elif status_group == "past":
             filter_query["order_status"] = {
                 "$in": [OrderStatus.DELIVERED, OrderStatus.CANCELLED]
             }
 
-    orders = (
-        await orders_collection.find(filter_query).sort("order_date", -1).to_list(1000)
-    )
+    # An exact order status takes precedence over the coarse grouping
+    if order_status:
+        filter_query["order_status"] = order_status
+
+    if payment_status:
+        filter_query["payment_status"] = payment_status
+
+    if user_id:
+        filter_query["user_id"] = user_id
+
+    if start_date or end_date:
+        filter_query["order_date"] = {}
+        if start_date:
+            filter_query["order_date"]["$gte"] = start_date
+        if end_date:
+            # Add 1 day to include the end date fully
+            filter_query["order_date"]["$lt"] = end_date + timedelta(days=1)
+
+    # Only read the archive when the filter can match archived orders
+    include_archive = await archive_needed(filter_query)
+
+    # Keyset pagination on (order_date, _id), both descending
+    if cursor:
+        filter_query = {"$and": [filter_query, cursor_filter(cursor)]}
+
+    # Fetch one extra order to know whether another page exists
+    fetch_orders = aggregate_admin_orders if USE_ORDER_AGGREGATION else find_admin_orders
+    orders, products_map = await fetch_orders(filter_query, limit + 1, include_archive)
+    if len(orders) > limit:
+        orders = orders[:limit]
+        response.headers["X-Next-Cursor"] = encode_order_cursor(orders[-1])
+
     orders = serialize_list(orders)
 
-    # Format response with product details
-    order_responses = []
+    # Format response with product details already resolved
+    return [await format_order_response(order, products_map) for order in orders]
+
+
+async def find_admin_orders(filter_query: Dict[str, Any], limit: int, include_archive: bool = False):
+    """One find for the page plus one $in query for legacy items"""
+    collections = [orders_collection]
+    if include_archive:
+        collections.append(orders_archive_collection)
+    cursors = [
+        collection.find(filter_query).sort([("order_date", -1), ("_id", -1)]).limit(limit)
+        for collection in collections
+    ]
+    orders = []
+    async for order in merge_order_cursors(cursors, descending=True):
+        orders.append(order)
+        if len(orders) >= limit:
+            break
+    products_map = await get_products_by_ids(collect_product_ids(orders))
+    return orders, products_map
+
+
+async def aggregate_admin_orders(filter_query: Dict[str, Any], limit: int, include_archive: bool = False):
+    """A single aggregation that joins legacy items to products inside MongoDB"""
+    pipeline = [
+        {"$match": filter_query},
+        *(archive_union_stages(filter_query) if include_archive else []),
+        {"$sort": {"order_date": -1, "_id": -1}},
+        {"$limit": limit},
+        *PRODUCTS_LOOKUP_STAGES,
+        {"$project": ORDER_PROJECTION},
+    ]
+    orders = await orders_collection.aggregate(pipeline).to_list(limit)
+    products_map = {}
     for order in orders:
-        order_with_products = await format_order_response(order)
-        order_responses.append(order_with_products)
-
-    return order_responses
+        for product in order.pop("products", []):
+            products_map[str(product["_id"])] = serialize_doc_id(product)
+    return orders, products_map
 
 
 @router.put("/admin/orders/bulk-update")
@@ -243,10 +349,12 @@ async def bulk_update_orders(
 ):
     """
     Bulk update multiple orders at once
-    Body should contain:
+    Body should contain either:
     - order_ids: list of order IDs to update
     - order_status: optional new order status
     - payment_status: optional new payment status
+    or:
+    - updates: list of per-order patches, each an OrderUpdate with an id
     """
     # Check if user is admin
     if not current_user.is_admin:
@@ -254,6 +362,9 @@ async def bulk_update_orders(
             status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized"
         )
     
+    if "updates" in update_data:
+        return await apply_order_patches(update_data["updates"])
+    
     # Validate input
     order_ids = update_data.get("order_ids", [])
     if not order_ids:
@@ -276,21 +387,130 @@ async def bulk_update_orders(
             detail="No update fields provided"
         )
     
+    update_fields["updated_at"] = datetime.utcnow()
+    
     # Convert string IDs to ObjectId
     object_ids = [ObjectId(id) for id in order_ids]
     
+    # Archived orders shown in the past view are edited in the live collection
+    await restore_archived_orders(object_ids)
+    
+    # Read the orders as they were to adjust the dashboard rollups
+    previous_orders = await orders_collection.find(
+        {"_id": {"$in": object_ids}}, STATS_PROJECTION
+    ).to_list(None)
+    
     # Update all matching orders
     result = await orders_collection.update_many(
         {"_id": {"$in": object_ids}},
         {"$set": update_fields}
     )
     
+    # Expire cached exports covering any of the updated orders
+    if result.modified_count:
+        invalidate_export_cache([o.get("order_date") for o in previous_orders])
+        await apply_order_stats(
+            [(o, -1) for o in previous_orders]
+            + [({**o, **update_fields}, 1) for o in previous_orders]
+        )
+    
     return {
         "message": f"Updated {result.modified_count} orders",
         "modified_count": result.modified_count
     }
 
 
+async def apply_order_patches(patches: List[Dict[str, Any]]):
+    """Apply different patches to many orders with one unordered bulk_write"""
+    if not patches:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No order updates provided"
+        )
+
+    results = {}
+    valid_patches = []
+    for index, patch in enumerate(patches):
+        order_id = patch.get("id") if isinstance(patch, dict) else None
+        key = order_id or f"#{index}"
+        try:
+            patch = OrderPatch(**patch)
+        except (TypeError, ValidationError) as e:
+            results[key] = {"id": order_id, "status": "error", "detail": str(e)}
+            continue
+        if not ObjectId.is_valid(patch.id):
+            results[key] = {"id": patch.id, "status": "error", "detail": "Invalid order id"}
+            continue
+        if patch.id in results:
+            results[f"#{index}"] = {"id": patch.id, "status": "error", "detail": "Duplicate order id"}
+            continue
+        results[patch.id] = {"id": patch.id, "status": "pending"}
+        valid_patches.append(patch)
+
+    # Archived orders shown in the past view are edited in the live collection
+    await restore_archived_orders([ObjectId(patch.id) for patch in valid_patches])
+
+    # One read for the orders and one for every product in the new items
+    orders = await orders_collection.find(
+        {"_id": {"$in": [ObjectId(patch.id) for patch in valid_patches]}}
+    ).to_list(None)
+    orders_map = {str(order["_id"]): order for order in orders}
+    products_map = await get_products_by_ids(
+        [item.product_id for patch in valid_patches for item in (patch.items or [])]
+    )
+
+    operations = []
+    changes = []
+    for patch in valid_patches:
+        order = orders_map.get(patch.id)
+        if not order:
+            results[patch.id] = {"id": patch.id, "status": "not_found"}
+            continue
+        try:
+            update_fields = build_order_update(order, patch, products_map)
+        except HTTPException as e:
+            results[patch.id] = {"id": patch.id, "status": "error", "detail": e.detail}
+            continue
+        if not update_fields:
+            results[patch.id] = {"id": patch.id, "status": "unchanged"}
+            continue
+
+        update_fields["updated_at"] = datetime.utcnow()
+        operations.append(UpdateOne({"_id": order["_id"]}, {"$set": update_fields}))
+        changes.append((patch.id, order, update_fields))
+
+    # Write errors are reported per operation index
+    failed = {}
+    if operations:
+        try:
+            await orders_collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                failed[error["index"]] = error.get("errmsg", "Write failed")
+
+    applied = []
+    for index, (order_id, order, update_fields) in enumerate(changes):
+        if index in failed:
+            results[order_id] = {"id": order_id, "status": "error", "detail": failed[index]}
+            continue
+        results[order_id] = {"id": order_id, "status": "updated"}
+        applied.append((order, update_fields))
+
+    # Keep exports and dashboard rollups in step with the applied patches
+    if applied:
+        invalidate_export_cache([order.get("order_date") for order, _ in applied])
+        await apply_order_stats(
+            [(order, -1) for order, _ in applied]
+            + [({**order, **update_fields}, 1) for order, update_fields in applied]
+        )
+
+    return {
+        "message": f"Updated {len(applied)} orders",
+        "modified_count": len(applied),
+        "results": list(results.values()),
+    }
+
+
 @router.put("/admin/orders/{order_id}", response_model=OrderResponse)
 async def update_order(
     order_id: str,
@@ -303,68 +523,33 @@ async def update_order(
             status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized"
         )
 
-    # Get order
+    # Get order, bringing it back from the archive if it was moved there
+    await restore_archived_orders([ObjectId(order_id)])
     order = await orders_collection.find_one({"_id": ObjectId(order_id)})
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Order not found"
         )
 
-    # Prepare update data
-    update_data = {}
-    if order_update.order_status is not None:
-        update_data["order_status"] = order_update.order_status
-
-    if order_update.payment_status is not None:
-        update_data["payment_status"] = order_update.payment_status
-
-    if order_update.delivery_address is not None:
-        update_data["delivery_address"] = order_update.delivery_address
-
-    if order_update.receiver_phone is not None:
-        update_data["receiver_phone"] = order_update.receiver_phone
-
-    # Handle items update if provided
+    # Products for the new items come from one query
+    products_map = {}
     if order_update.items is not None:
-        items_data = []
-        total_amount = 0
-
-        # Process each item
-        for item in order_update.items:
-            # Verify the product exists
-            product = await products_collection.find_one(
-                {"_id": ObjectId(item.product_id)}
-            )
-            if not product:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Product with id {item.product_id} not found",
-                )
-
-            # Add item to order
-            order_item = {
-                "product_id": item.product_id,
-                "quantity": item.quantity,
-                "price_at_purchase": item.price_at_purchase,
-            }
-            
-            # Include selected option if provided
-            if item.selected_option:
-                order_item["selected_option"] = item.selected_option
-
-            items_data.append(order_item)
-            total_amount += item.price_at_purchase * item.quantity
-
-        update_data["items"] = items_data
-        update_data["total_amount"] = total_amount
+        products_map = await get_products_by_ids(
+            [item.product_id for item in order_update.items]
+        )
+    update_data = build_order_update(order, order_update, products_map)
 
+    # Update and read back the order in one round trip
+    updated_order = order
     if update_data:
-        await orders_collection.update_one(
-            {"_id": ObjectId(order_id)}, {"$set": update_data}
+        update_data["updated_at"] = datetime.utcnow()
+        updated_order = await orders_collection.find_one_and_update(
+            {"_id": ObjectId(order_id)},
+            {"$set": update_data},
+            return_document=ReturnDocument.AFTER,
         )
-
-    # Get updated order
-    updated_order = await orders_collection.find_one({"_id": ObjectId(order_id)})
+        invalidate_export_cache([order.get("order_date")])
+        await apply_order_stats([(order, -1), (updated_order, 1)])
 
     # Format response
     order_response = await format_order_response(serialize_doc_id(updated_order))
@@ -382,15 +567,18 @@ async def delete_order(
             status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized"
         )
 
-    # Check if order exists
-    order = await orders_collection.find_one({"_id": ObjectId(order_id)})
+    # Check if order exists, live or archived
+    order = await find_order({"_id": ObjectId(order_id)})
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Order not found"
         )
 
-    # Delete order
+    # Delete order from whichever collection holds it
     await orders_collection.delete_one({"_id": ObjectId(order_id)})
+    await orders_archive_collection.delete_one({"_id": ObjectId(order_id)})
+    invalidate_export_cache([order.get("order_date")])
+    await apply_order_stats([(order, -1)])
 
 
 @router.post("/admin/custom-orders", response_model=OrderResponse)
@@ -410,8 +598,19 @@ async def create_custom_order(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
 
-    # Apply discount if specified
+    # Snapshot every product from one query
     items = [item.dict() for item in order_data.items]
+    products_map = await get_products_by_ids([item["product_id"] for item in items])
+    for item in items:
+        product = products_map.get(item["product_id"])
+        if not product:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Product with id {item['product_id']} not found",
+            )
+        item["product"] = build_product_snapshot(product)
+
+    # Apply discount if specified
     base_total = sum(item["price_at_purchase"] * item["quantity"] for item in items)
     total_amount = base_total
     
@@ -428,9 +627,11 @@ async def create_custom_order(
         total_amount = order_data.total_amount
 
     # Create new order
+    now = datetime.utcnow()
     order = {
         "user_id": order_data.user_id,
-        "order_date": datetime.utcnow(),
+        "order_date": now,
+        "updated_at": now,
         "delivery_address": order_data.delivery_address,
         "receiver_phone": order_data.receiver_phone,
         "items": items,
@@ -451,6 +652,8 @@ async def create_custom_order(
     # Save order to database
     result = await orders_collection.insert_one(order)
     order["id"] = str(result.inserted_id)
+    invalidate_export_cache([order["order_date"]])
+    await apply_order_stats([(order, 1)])
 
     # Format response
     order_response = await format_order_response(order)
@@ -458,6 +661,68 @@ async def create_custom_order(
     return order_response
 
 
+# Move old delivered and cancelled orders to the archive (also runs on a timer)
+@router.post("/admin/orders/archive", include_in_schema=False)
+async def archive_old_orders(
+    older_than_days: int = Query(ORDER_ARCHIVE_AFTER_DAYS, ge=1),
+    current_user: UserInDB = Depends(get_current_user),
+):
+    # Check if user is admin
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized"
+        )
+
+    archived = await archive_orders(older_than_days)
+    return {"message": f"Archived {archived} orders older than {older_than_days} days"}
+
+
+# Store product snapshots on orders written before they existed (migration helper)
+@router.post("/admin/orders/backfill-snapshots", include_in_schema=False)
+async def backfill_order_snapshots(current_user: UserInDB = Depends(get_current_user)):
+    # Check if user is admin
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized"
+        )
+
+    cursor = orders_collection.find(
+        {"items": {"$elemMatch": {"product": {"$exists": False}}}},
+        {"items": 1},
+    ).batch_size(SNAPSHOT_BACKFILL_BATCH_SIZE)
+
+    updated_count = 0
+    batch = []
+    async for order in cursor:
+        batch.append(order)
+        if len(batch) >= SNAPSHOT_BACKFILL_BATCH_SIZE:
+            updated_count += await backfill_snapshot_batch(batch)
+            batch = []
+    if batch:
+        updated_count += await backfill_snapshot_batch(batch)
+
+    return {"message": f"Backfilled product snapshots on {updated_count} orders"}
+
+
+async def backfill_snapshot_batch(orders):
+    # One product query and one bulk write per batch of orders
+    products_map = await get_products_by_ids(collect_product_ids(orders))
+    operations = []
+    for order in orders:
+        items = order.get("items", [])
+        for item in items:
+            product = products_map.get(item.get("product_id"))
+            if not item.get("product") and product:
+                item["product"] = build_product_snapshot(product)
+        # Items whose product is already gone are left for the legacy path
+        operations.append(
+            UpdateOne({"_id": order["_id"]}, {"$set": {"items": items}})
+        )
+
+    result = await orders_collection.bulk_write(operations, ordered=False)
+    return result.modified_count
+
+
 @router.post("/admin/export-orders")
 async def export_orders(
     export_data: OrderExportRequest,
@@ -469,6 +734,128 @@ async def export_orders(
             status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized"
         )
     
+    export_format = get_export_format(export_data)
+    extension, media_type = EXPORT_FORMATS[export_format]
+    filter_query = build_export_filter(export_data)
+    filename = f"orders_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    
+    # Text formats stream out as the cursor advances
+    if export_format in ("csv", "ndjson"):
+        return StreamingResponse(
+            iter_export_text(filter_query, export_format),
+            media_type=media_type,
+            headers=headers,
+        )
+    
+    # Write the file to a temporary path instead of holding it in memory
+    with NamedTemporaryFile(delete=False, suffix=f".{extension}") as temp:
+        export_path = temp.name
+    try:
+        await write_export_file(filter_query, export_path, export_format=export_format)
+    except HTTPException:
+        os.remove(export_path)
+        raise
+    
+    # Stream the file for download and remove it afterwards
+    return StreamingResponse(
+        iter_file(export_path),
+        media_type=media_type,
+        headers=headers,
+        background=BackgroundTask(os.remove, export_path),
+    )
+
+
+@router.post("/admin/export-jobs", response_model=ExportJobResponse)
+async def create_export_job(
+    export_data: OrderExportRequest,
+    background_tasks: BackgroundTasks,
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """
+    Queue an export in the background and return its job.
+    Identical filters share one job, and a finished file is reused
+    until an order in its date range changes.
+    """
+    # Check if user is admin
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized"
+        )
+
+    export_format = get_export_format(export_data)
+    extension, _ = EXPORT_FORMATS[export_format]
+    filter_query = build_export_filter(export_data)
+    job, is_new = get_or_create_export_job(filter_query, export_format, extension)
+    if is_new:
+        background_tasks.add_task(
+            run_export_job,
+            job,
+            filter_query,
+            partial(write_export_file, export_format=export_format),
+            count_export_orders,
+        )
+
+    return format_export_job(job)
+
+
+@router.get("/admin/export-jobs/{job_id}", response_model=ExportJobResponse)
+async def get_export_job(
+    job_id: str, current_user: UserInDB = Depends(get_current_user)
+):
+    # Check if user is admin
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized"
+        )
+
+    job = export_jobs.get(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Export job not found"
+        )
+
+    return format_export_job(job)
+
+
+@router.get("/admin/export-jobs/{job_id}/download")
+async def download_export_job(
+    job_id: str, current_user: UserInDB = Depends(get_current_user)
+):
+    # Check if user is admin
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized"
+        )
+
+    job = export_jobs.get(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Export job not found"
+        )
+
+    if job["status"] != JOB_COMPLETED:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Export job is {job['status']}",
+        )
+
+    extension, media_type = EXPORT_FORMATS[job["format"]]
+    filename = f"orders_export_{job['completed_at'].strftime('%Y%m%d_%H%M%S')}.{extension}"
+    return FileResponse(job["path"], media_type=media_type, filename=filename)
+
+
+def get_export_format(export_data: OrderExportRequest):
+    export_format = (export_data.format or "excel").lower()
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid format specified. Use one of: {', '.join(EXPORT_FORMATS)}.",
+        )
+    return export_format
+
+
+def build_export_filter(export_data: OrderExportRequest):
     # Validate and prepare filter
     filter_query = {}
     if export_data.status_filter and export_data.status_filter != "all":
@@ -487,204 +874,375 @@ async def export_orders(
         end_date = export_data.end_date + timedelta(days=1)
         filter_query["order_date"]["$lt"] = end_date
     
-    # Process the export immediately instead of in background
-    excel_data = await process_export_orders(filter_query)
+    return filter_query
+
+
+def format_export_job(job):
+    download_url = None
+    if job["status"] == JOB_COMPLETED:
+        download_url = f"/admin/export-jobs/{job['id']}/download"
+
+    return ExportJobResponse(
+        id=job["id"],
+        status=job["status"],
+        processed=job["processed"],
+        total=job["total"],
+        created_at=job["created_at"],
+        completed_at=job["completed_at"],
+        error=job["error"],
+        download_url=download_url,
+    )
+
+
+# Export format -> (file extension, media type)
+EXPORT_FORMATS = {
+    "excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("csv", "text/csv"),
+    "ndjson": ("ndjson", "application/x-ndjson"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+EXPORT_COLUMNS = [
+    "round_number",
+    "website_order_number",
+    "type",
+    "customer_name",
+    "phone",
+    "receiver_phone",
+    "address",
+    "delivery_address",
+    "product_name",
+    "size",
+    "product_quantity",
+    "total_dozens",
+    "total_price",
+    "CP",
+    "SP",
+    "payment_status_website",
+    "delivery_status_website",
+    "payment_validation",
+    "delivery_validation",
+]
+# Columns gathered per item before the derived ones are computed
+EXPORT_SOURCE_FIELDS = [
+    "website_order_number",
+    "customer_name",
+    "phone",
+    "order_phone",
+    "address",
+    "order_address",
+    "product_name",
+    "size",
+    "type",
+    "product_quantity",
+    "price_at_purchase",
+    "payment_status_website",
+    "delivery_status_website",
+]
+EXPORT_BLANK_COLUMNS = ["round_number", "CP", "SP", "payment_validation", "delivery_validation"]
+DOZENS_PER_UNIT = {
+    "quantity": 1,
+    "box:big": 5.5,
+    "box:medium": 6,
+    "box:small": 6.5,
+}
+# Fixed column types so every row group shares one schema
+EXPORT_NUMERIC_COLUMNS = {
+    "website_order_number": pa.int64(),
+    "product_quantity": pa.int64(),
+    "total_dozens": pa.float64(),
+    "total_price": pa.float64(),
+}
+EXPORT_PARQUET_SCHEMA = pa.schema(
+    [(name, EXPORT_NUMERIC_COLUMNS.get(name, pa.string())) for name in EXPORT_COLUMNS]
+)
+EXPORT_BATCH_SIZE = 500
+
+# Admin listings and exports can join inside MongoDB instead of in Python
+USE_ORDER_AGGREGATION = os.getenv("USE_ORDER_AGGREGATION", "false").lower() == "true"
+
+ORDER_PROJECTION = {
+    "user_id": 1,
+    "order_date": 1,
+    "delivery_address": 1,
+    "receiver_phone": 1,
+    "items": 1,
+    "total_amount": 1,
+    "order_status": 1,
+    "payment_status": 1,
+    "products": 1,
+}
+
+# Join only the items written before product snapshots existed. The ids are
+# converted first so the join is an equality match on the products _id index
+PRODUCTS_LOOKUP_STAGES = [
+    {
+        "$addFields": {
+            "legacy_product_ids": {
+                "$map": {
+                    "input": {
+                        "$filter": {
+                            "input": {"$ifNull": ["$items", []]},
+                            "as": "item",
+                            "cond": {"$eq": [{"$type": "$$item.product"}, "missing"]},
+                        }
+                    },
+                    "as": "item",
+                    "in": {
+                        "$convert": {
+                            "input": "$$item.product_id",
+                            "to": "objectId",
+                            "onError": None,
+                        }
+                    },
+                }
+            }
+        }
+    },
+    {
+        "$lookup": {
+            "from": "products",
+            "localField": "legacy_product_ids",
+            "foreignField": "_id",
+            "pipeline": [{"$project": {"name": 1, "image_url": 1, "category": 1}}],
+            "as": "products",
+        }
+    },
+]
+
+USERS_LOOKUP_STAGE = {
+    "$lookup": {
+        "from": "users",
+        "let": {
+            "user_id": {
+                "$convert": {"input": "$user_id", "to": "objectId", "onError": None}
+            }
+        },
+        "pipeline": [
+            {"$match": {"$expr": {"$eq": ["$_id", "$$user_id"]}}},
+            {"$project": {"name": 1, "phone": 1, "address": 1}},
+        ],
+        "as": "user",
+    }
+}
+UNKNOWN_USER = {"name": "Unknown", "phone": "", "address": ""}
+
+
+def archive_union_stages(filter_query: Dict[str, Any]):
+    # Pull matching archived orders into the same pipeline
+    return [
+        {
+            "$unionWith": {
+                "coll": orders_archive_collection.name,
+                "pipeline": [{"$match": filter_query}],
+            }
+        }
+    ]
+
+
+async def count_export_orders(filter_query: Dict[str, Any]):
+    # Progress total across the live orders and, when it can match, the archive
+    total = await orders_collection.count_documents(filter_query)
+    if await archive_needed(filter_query):
+        total += await orders_archive_collection.count_documents(filter_query)
+    return total
+
+
+async def iter_export_batches(filter_query: Dict[str, Any], include_archive: bool = False):
+    """Stream orders from the cursor with their users and products resolved per batch"""
+    collections = [orders_collection]
+    if include_archive:
+        collections.append(orders_archive_collection)
+    cursors = [
+        collection.find(filter_query)
+        .sort([("order_date", 1), ("_id", 1)])
+        .batch_size(EXPORT_BATCH_SIZE)
+        for collection in collections
+    ]
+    batch = []
+    async for order in merge_order_cursors(cursors):
+        batch.append(order)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield await resolve_export_batch(batch)
+            batch = []
+    if batch:
+        yield await resolve_export_batch(batch)
+
+
+async def iter_export_batches_aggregated(filter_query: Dict[str, Any], include_archive: bool = False):
+    """Stream orders from one aggregation that joins users and products in MongoDB"""
+    pipeline = [
+        {"$match": filter_query},
+        *(archive_union_stages(filter_query) if include_archive else []),
+        {"$sort": {"order_date": 1, "_id": 1}},
+        *PRODUCTS_LOOKUP_STAGES,
+        USERS_LOOKUP_STAGE,
+        {"$project": {**ORDER_PROJECTION, "user": 1}},
+    ]
+    cursor = orders_collection.aggregate(pipeline, batchSize=EXPORT_BATCH_SIZE)
+    orders, users_map, products_map = [], {}, {}
+    async for order in cursor:
+        for product in order.pop("products", []):
+            products_map[str(product["_id"])] = serialize_doc_id(product)
+        for user in order.pop("user", []):
+            users_map[str(user["_id"])] = serialize_doc_id(user)
+        orders.append(serialize_doc_id(order))
+        if len(orders) >= EXPORT_BATCH_SIZE:
+            yield orders, users_map, products_map
+            orders, users_map, products_map = [], {}, {}
+    if orders:
+        yield orders, users_map, products_map
+
+
+async def resolve_export_batch(orders):
+    orders = serialize_list(orders)
+    users_map = await get_users_by_ids({order.get("user_id") for order in orders})
+    products_map = await get_products_by_ids(collect_product_ids(orders))
+    return orders, users_map, products_map
+
+
+def build_export_frame(orders, users_map, products_map, order_number):
+    """
+    Flatten a batch of orders into the export columns, one row per item.
+    Returns the frame and the order number the next batch starts from.
+    """
+    columns = {name: [] for name in EXPORT_SOURCE_FIELDS}
+    for order in orders:
+        user = users_map.get(order.get("user_id"), UNKNOWN_USER)
+        for item in order.get("items", []):
+            if item is None:
+                continue
+            
+            product = item.get("product") or products_map.get(item.get("product_id"))
+            if product is None:
+                continue
+            
+            # Get option details if present
+            selected_option = item.get("selected_option") or {}
+            
+            columns["website_order_number"].append(order_number)
+            columns["customer_name"].append(user.get("name", ""))
+            columns["phone"].append(user.get("phone", ""))
+            columns["order_phone"].append(order.get("receiver_phone") or "")
+            columns["address"].append(user.get("address", ""))
+            columns["order_address"].append(order.get("delivery_address") or "")
+            columns["product_name"].append(product.get("name", ""))
+            columns["size"].append(selected_option.get("size", ""))
+            columns["type"].append(selected_option.get("type", ""))
+            columns["product_quantity"].append(item.get("quantity", 0))
+            columns["price_at_purchase"].append(item.get("price_at_purchase", 0))
+            columns["payment_status_website"].append(enum_value(order.get("payment_status", "")))
+            columns["delivery_status_website"].append(enum_value(order.get("order_status", "")))
+        
+        # Increment the order number after processing all items in the current order
+        order_number += 1
     
-    # Return the Excel file for download
-    filename = f"orders_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    frame = pd.DataFrame(columns)
+    if frame.empty:
+        return frame.reindex(columns=EXPORT_COLUMNS), order_number
     
-    return Response(
-        content=excel_data,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers=headers
+    # Dozens per unit come from a lookup on the option; any "quantity" option is one dozen
+    option_key = frame["type"].where(
+        frame["type"] == "quantity", frame["type"] + ":" + frame["size"]
     )
+    frame["total_dozens"] = option_key.map(DOZENS_PER_UNIT).fillna(0) * frame["product_quantity"]
+    frame["total_price"] = frame["price_at_purchase"] * frame["product_quantity"]
+    
+    # Only show receiver phone and delivery address when they differ from the user's
+    frame["receiver_phone"] = frame["order_phone"].where(frame["order_phone"] != frame["phone"], "")
+    frame["delivery_address"] = frame["order_address"].where(frame["order_address"] != frame["address"], "")
+    
+    for name in EXPORT_BLANK_COLUMNS:
+        frame[name] = ""
+    return frame[EXPORT_COLUMNS], order_number
+
 
+async def iter_export_frames(filter_query: Dict[str, Any], on_progress=None):
+    """Yield one export frame per batch of orders streamed from the cursor"""
+    order_number = 1
+    include_archive = await archive_needed(filter_query)
+    iter_batches = iter_export_batches_aggregated if USE_ORDER_AGGREGATION else iter_export_batches
+    async for orders, users_map, products_map in iter_batches(filter_query, include_archive):
+        frame, order_number = build_export_frame(orders, users_map, products_map, order_number)
+        if on_progress:
+            on_progress(order_number - 1)
+        yield frame
 
-async def process_export_orders(filter_query: Dict[str, Any]):
-    """Process orders and return the Excel file data with conditional formatting"""
+
+async def process_export_orders(filter_query: Dict[str, Any], output_path: str, on_progress=None):
+    """Stream orders into an Excel file at output_path with conditional formatting"""
     try:
-        # Create a BytesIO object to store the Excel file
-        output = io.BytesIO()
+        # Rows are flushed to disk as they are written
+        workbook = xlsxwriter.Workbook(output_path, {"constant_memory": True})
+        header_format = workbook.add_format({"bold": True, "border": 1})
+        
+        # PART 1: Create "orders" sheet with the specified format (now first)
+        worksheet = workbook.add_worksheet("orders")
+        worksheet.write_row(0, 0, EXPORT_COLUMNS, header_format)
+        
+        row_index = 1
+        async for frame in iter_export_frames(filter_query, on_progress):
+            for row in frame.itertuples(index=False, name=None):
+                worksheet.write_row(row_index, 0, row)
+                row_index += 1
         
-        # Create Excel writer
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            # PART 1: Create "orders" sheet with the specified format (now first)
-            orders = await orders_collection.find(filter_query).sort("order_date", 1).to_list(1000)
-            orders = serialize_list(orders)
+        if row_index > 1:
+            # Define formats for conditional formatting
+            duplicate_order_format = workbook.add_format({'bg_color': '#FFFF99'})  # Light yellow
+            same_customer_format = workbook.add_format({'bg_color': '#00e8ff'})  # Light Blue
+            paid_delivered_format = workbook.add_format({'bg_color': '#90EE90'})  # Light green
+            missing_size_format = workbook.add_format({'bg_color': '#FFCCCB'})  # Light red
             
-            # Process orders to include product details
-            processed_orders = []
-            order_number = 1
+            # Last written row, 1-based as in Excel
+            max_row = row_index
             
-            for order in orders:
-                if order is None:
-                    continue
-                
-                # Get user info
-                user_id = order.get("user_id")
-                if user_id is None:
-                    user = {"name": "Unknown", "phone": "", "address": ""}
-                else:
-                    user = await users_collection.find_one({"_id": ObjectId(user_id)})
-                    if user is None:
-                        user = {"name": "Unknown", "phone": "", "address": ""}
-                    user = serialize_doc_id(user)
-                
-                # Process each item in the order
-                items = order.get("items", [])
-                for item in items:
-                    if item is None:
-                        continue
-                    
-                    product_id = item.get("product_id")
-                    if product_id is None:
-                        continue
-                    
-                    product = await products_collection.find_one({"_id": ObjectId(product_id)})
-                    if product is None:
-                        continue
-                    
-                    product = serialize_doc_id(product)
-                    
-                    # Get option details if present
-                    size = ""
-                    option_type = ""
-                    total_dozens = 0
-                    
-                    selected_option = item.get("selected_option")
-                    if selected_option is not None:
-                        size = selected_option.get("size", "")
-                        option_type = selected_option.get("type", "")
-                        
-                        # Calculate total dozens
-                        if option_type == "quantity":
-                            total_dozens = 1 * item.get("quantity", 0)
-                        elif option_type == "box":
-                            if size == "big":
-                                total_dozens = 5.5 * item.get("quantity", 0)
-                            elif size == "medium":
-                                total_dozens = 6 * item.get("quantity", 0)
-                            elif size == "small":
-                                total_dozens = 6.5 * item.get("quantity", 0)
-                    
-                    # Calculate if receiver_phone should be shown
-                    receiver_phone = ""
-                    if order.get("receiver_phone") != user.get("phone"):
-                        receiver_phone = order.get("receiver_phone", "")
-                    
-                    # Calculate if delivery_address should be shown
-                    delivery_address = ""
-                    if order.get("delivery_address") != user.get("address"):
-                        delivery_address = order.get("delivery_address", "")
-                    
-                    # Create row for the order item
-                    order_row = {
-                        "round_number": "",
-                        "website_order_number": order_number,
-                        "type": "website",
-                        "customer_name": user.get("name", ""),
-                        "phone": user.get("phone", ""),
-                        "receiver_phone": receiver_phone,
-                        "address": user.get("address", ""),
-                        "delivery_address": delivery_address,
-                        "product_name": product.get("name", ""),
-                        "size": size,
-                        "type": option_type,
-                        "product_quantity": item.get("quantity", 0),
-                        "total_dozens": total_dozens,
-                        "total_price": item.get("price_at_purchase", 0) * item.get("quantity", 0),
-                        "CP": "",
-                        "SP": "",
-                        "payment_status_website": order.get("payment_status", ""),
-                        "delivery_status_website": order.get("order_status", ""),
-                        "payment_validation": "",
-                        "delivery_validation": "",
-                    }
-                    
-                    processed_orders.append(order_row)
-                
-                # Increment the order number after processing all items in the current order
-                order_number += 1
+            # 1. Highlight duplicate order numbers
+            worksheet.conditional_format(f'B2:B{max_row}', {
+                'type': 'duplicate',
+                'format': duplicate_order_format
+            })
             
-            # Create orders DataFrame and write to sheet
-            if processed_orders:
-                orders_df = pd.DataFrame(processed_orders)
-                orders_df.to_excel(writer, sheet_name="orders", index=False)
-                
-                # Get the xlsxwriter workbook and worksheet objects
-                workbook = writer.book
-                worksheet = writer.sheets['orders']
-                
-                # Define formats for conditional formatting
-                duplicate_order_format = workbook.add_format({'bg_color': '#FFFF99'})  # Light yellow
-                same_customer_format = workbook.add_format({'bg_color': '#00e8ff'})  # Light Blue
-                paid_delivered_format = workbook.add_format({'bg_color': '#90EE90'})  # Light green
-                missing_size_format = workbook.add_format({'bg_color': '#FFCCCB'})  # Light red
-                
-                # Get number of rows and columns in the dataframe
-                max_row = len(orders_df) + 1
-                
-                # 1. Highlight duplicate order numbers
-                worksheet.conditional_format(f'B2:B{max_row}', {
-                    'type': 'duplicate',
-                    'format': duplicate_order_format
-                })
-                
-                # 2. Highlight cells where payment_status_website is "paid"
-                worksheet.conditional_format(f'P2:P{max_row}', {
-                    'type': 'text',
-                    'criteria': 'containing',
-                    'value': 'paid',
-                    'format': paid_delivered_format
-                })
-                
-                # 3. Highlight cells where delivery_status_website is "delivered"
-                worksheet.conditional_format(f'Q2:Q{max_row}', {
-                    'type': 'text',
-                    'criteria': 'containing',
-                    'value': 'delivered',
-                    'format': paid_delivered_format
-                })
-                
-                # 4. Highlight empty size cells
-                worksheet.conditional_format(f'J2:J{max_row}', {
-                    'type': 'blanks',
-                    'format': missing_size_format
-                })
-                
-                # 5. Custom formula to highlight rows with the same customer details
-                # Get columns for customer details
-                
-                # Formula to check if a row has the same customer details as the previous row
-                # Using formula for each row to check if all customer info fields match the previous row
-                for row in range(3, max_row + 1):  # Start from row 3 to compare with previous row
-                    worksheet.conditional_format(f'D{row}', {
-                        'type': 'formula',
-                        'criteria': f'=AND(D{row}=D{row-1}, D{row}=D{row-1}, E{row}=E{row-1}, F{row}=F{row-1}, G{row}=G{row-1})',
-                        'format': same_customer_format
-                    })
+            # 2. Highlight cells where payment_status_website is "paid"
+            worksheet.conditional_format(f'P2:P{max_row}', {
+                'type': 'text',
+                'criteria': 'containing',
+                'value': 'paid',
+                'format': paid_delivered_format
+            })
+            
+            # 3. Highlight cells where delivery_status_website is "delivered"
+            worksheet.conditional_format(f'Q2:Q{max_row}', {
+                'type': 'text',
+                'criteria': 'containing',
+                'value': 'delivered',
+                'format': paid_delivered_format
+            })
             
-            # PART 2: Create "users" sheet (now second)
-            users = await users_collection.find().to_list(1000)
-            users = serialize_list(users)
+            # 4. Highlight empty size cells
+            worksheet.conditional_format(f'J2:J{max_row}', {
+                'type': 'blanks',
+                'format': missing_size_format
+            })
             
-            # Process users data
-            processed_users = []
-            for i, user in enumerate(users, 1):
-                processed_users.append({
-                    "code": f"AM{i:03d}",
-                    "name": user.get("name", ""),
-                    "phone": user.get("phone", "")
+            # 5. Highlight rows with the same customer details as the previous row
+            # One rule over the whole range; references are relative to its first cell
+            if max_row >= 3:
+                worksheet.conditional_format(f'D3:D{max_row}', {
+                    'type': 'formula',
+                    'criteria': '=AND(D3=D2, E3=E2, F3=F2, G3=G2)',
+                    'format': same_customer_format
                 })
-                
-            # Create users DataFrame and write to sheet
-            users_df = pd.DataFrame(processed_users)
-            users_df.to_excel(writer, sheet_name="users", index=False)
         
-        # Return the Excel file data
-        output.seek(0)
-        return output.getvalue()
+        # PART 2: Create "users" sheet (now second)
+        users_sheet = workbook.add_worksheet("users")
+        users_sheet.write_row(0, 0, ["code", "name", "phone"], header_format)
+        
+        i = 0
+        async for user in users_collection.find({}, {"name": 1, "phone": 1}):
+            i += 1
+            users_sheet.write_row(i, 0, [f"AM{i:03d}", user.get("name", ""), user.get("phone", "")])
+        
+        workbook.close()
         
     except Exception as e:
         print(f"Error processing orders: {str(e)}")
@@ -693,6 +1251,57 @@ async def process_export_orders(filter_query: Dict[str, Any]):
             detail=f"Error processing orders: {str(e)}"
         )
 
+
+async def write_export_file(filter_query: Dict[str, Any], output_path: str, on_progress=None, export_format: str = "excel"):
+    """Write an export of any supported format to output_path"""
+    if export_format == "excel":
+        return await process_export_orders(filter_query, output_path, on_progress)
+    if export_format == "parquet":
+        return await process_export_parquet(filter_query, output_path, on_progress)
+    
+    with open(output_path, "w", encoding="utf-8", newline="") as f:
+        async for chunk in iter_export_text(filter_query, export_format, on_progress):
+            f.write(chunk)
+
+
+async def iter_export_text(filter_query: Dict[str, Any], export_format: str, on_progress=None):
+    """Yield CSV or NDJSON text one batch of rows at a time"""
+    header_written = False
+    async for frame in iter_export_frames(filter_query, on_progress):
+        if export_format == "csv":
+            yield frame.to_csv(index=False, header=not header_written, lineterminator="\n")
+            header_written = True
+        elif not frame.empty:
+            yield frame.to_json(orient="records", lines=True, force_ascii=False).rstrip("\n") + "\n"
+    
+    if export_format == "csv" and not header_written:
+        yield ",".join(EXPORT_COLUMNS) + "\n"
+
+
+async def process_export_parquet(filter_query: Dict[str, Any], output_path: str, on_progress=None):
+    """Write orders to a Parquet file with one row group per batch"""
+    try:
+        with pq.ParquetWriter(output_path, EXPORT_PARQUET_SCHEMA) as writer:
+            async for frame in iter_export_frames(filter_query, on_progress):
+                if frame.empty:
+                    continue
+                writer.write_table(
+                    pa.Table.from_pandas(frame, schema=EXPORT_PARQUET_SCHEMA, preserve_index=False)
+                )
+    
+    except Exception as e:
+        print(f"Error processing orders: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error processing orders: {str(e)}"
+        )
+
+
+def iter_file(path: str, chunk_size: int = 64 * 1024):
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
 # Helper functions
 
 
@@ -704,21 +1313,283 @@ async def get_order_with_products(order_id):
     return await format_order_response(serialize_doc_id(order))
 
 
-async def format_order_response(order):
+async def run_idempotent(idempotency_key, user_id, endpoint, handler):
+    """
+    Run handler once per Idempotency-Key.
+    A retry with the same key gets the stored response back instead of
+    placing another order; requests without a key always run.
+    """
+    if not idempotency_key:
+        return await handler()
+
+    record = await begin_idempotent_request(user_id, idempotency_key, endpoint)
+    if record:
+        if record["endpoint"] != endpoint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used for a different request",
+            )
+        if record["response"] is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still being processed",
+            )
+        return record["response"]
+
+    try:
+        response = await handler()
+    except Exception:
+        # Let the client retry a request that did not go through
+        await discard_idempotent_request(user_id, idempotency_key)
+        raise
+
+    await save_idempotent_response(user_id, idempotency_key, jsonable_encoder(response))
+    return response
+
+
+def build_order_update(order, order_update: OrderUpdate, products_map):
+    """Translate an OrderUpdate into the $set fields for one order"""
+    # Prepare update data
+    update_data = {}
+    if order_update.order_status is not None:
+        update_data["order_status"] = order_update.order_status
+
+    if order_update.payment_status is not None:
+        update_data["payment_status"] = order_update.payment_status
+
+    if order_update.delivery_address is not None:
+        update_data["delivery_address"] = order_update.delivery_address
+
+    if order_update.receiver_phone is not None:
+        update_data["receiver_phone"] = order_update.receiver_phone
+
+    # Handle items update if provided
+    if order_update.items is not None:
+        items_data = []
+        total_amount = 0
+
+        # Existing snapshots keep items of deleted or renamed products intact
+        snapshots = {
+            item["product_id"]: item["product"]
+            for item in order.get("items", [])
+            if item.get("product")
+        }
+
+        # Process each item
+        for item in order_update.items:
+            # Verify the product exists
+            product = products_map.get(item.product_id)
+            if product:
+                snapshot = snapshots.get(item.product_id) or build_product_snapshot(product)
+            elif item.product_id in snapshots:
+                snapshot = snapshots[item.product_id]
+            else:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Product with id {item.product_id} not found",
+                )
+
+            # Add item to order
+            order_item = {
+                "product_id": item.product_id,
+                "quantity": item.quantity,
+                "price_at_purchase": item.price_at_purchase,
+                "product": snapshot,
+            }
+            
+            # Include selected option if provided
+            if item.selected_option:
+                order_item["selected_option"] = item.selected_option
+
+            items_data.append(order_item)
+            total_amount += item.price_at_purchase * item.quantity
+
+        update_data["items"] = items_data
+        update_data["total_amount"] = total_amount
+
+    return update_data
+
+
+def prepare_order_items(cart_items, products_map):
+    """
+    Validate checkout items and price them.
+    Returns the order items, the order total and the quantity to reserve per product.
+    """
+    items = []
+    total_amount = 0
+    quantities = {}
+
+    for item in cart_items:
+        product = products_map.get(item.product_id)
+        if not product:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Product with id {item.product_id} not found",
+            )
+
+        # Check if product is active and has sufficient stock
+        if product.get("status", "active") != "active":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Product '{product['name']}' is not available for purchase",
+            )
+
+        # The same product can appear once per selected option
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+        if quantities[item.product_id] > product.get("stock_quantity", 0):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Insufficient stock for '{product['name']}'. Available: {product.get('stock_quantity', 0)}",
+            )
+
+        # Determine price based on selected option
+        item_price = product["price"]
+        selected_option = None
+        
+        if item.selected_option:
+            # No need to call .dict() since it's already a dict
+            selected_option = item.selected_option
+            item_price = selected_option["price"]
+
+        # Add item to order
+        order_item = {
+            "product_id": item.product_id,
+            "quantity": item.quantity,
+            "price_at_purchase": item_price,
+            "product": build_product_snapshot(product),
+        }
+        
+        if selected_option:
+            order_item["selected_option"] = selected_option
+
+        items.append(order_item)
+        total_amount += item_price * item.quantity
+
+    return items, total_amount, quantities
+
+
+async def save_order_with_stock(order, quantities, products_map):
+    """Reserve stock for an order in one conditional bulk write, then insert it"""
+    reservation_id = await reserve_stock(quantities)
+    if reservation_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Insufficient stock for one or more items. Please review your cart.",
+        )
+
+    # Save order to database, giving the stock back if that fails
+    try:
+        result = await orders_collection.insert_one(order)
+    except Exception:
+        await release_stock(quantities, reservation_id)
+        raise
+    await confirm_stock_reservation(quantities, reservation_id)
+    order["id"] = str(result.inserted_id)
+    for product_id, quantity in quantities.items():
+        products_map[product_id]["stock_quantity"] -= quantity
+    # Product pages show stock; cached listings may lag it by up to their TTL,
+    # which is safe because checkout reserves stock atomically
+    evict_cached_products(product_cache_key("product", product_id) for product_id in quantities)
+    invalidate_export_cache([order["order_date"]])
+    await apply_order_stats([(order, 1)])
+
+
+def repeat_cart_item(item, product):
+    """Turn a past order item into a checkout item using the product's current option"""
+    selected_option = item.get("selected_option")
+    if selected_option and product:
+        current_option = find_price_option(product, selected_option)
+        if current_option is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"The {selected_option.get('size', '')} {selected_option.get('type', '')} option of '{product['name']}' is no longer available",
+            )
+        selected_option = current_option
+
+    return CartItem(
+        product_id=item["product_id"],
+        quantity=item["quantity"],
+        selected_option=selected_option,
+    )
+
+
+def find_price_option(product, selected_option):
+    for option in product.get("price_options") or []:
+        if (
+            option.get("type") == selected_option.get("type")
+            and option.get("size") == selected_option.get("size")
+        ):
+            return option
+    return None
+
+
+def encode_order_cursor(order):
+    # Opaque cursor pointing at the last order of a page
+    raw = f"{order['order_date'].isoformat()}|{order['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def cursor_filter(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        order_date, order_id = raw.split("|")
+        order_date = datetime.fromisoformat(order_date)
+        order_id = ObjectId(order_id)
+    except (ValueError, InvalidId):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+
+    return {
+        "$or": [
+            {"order_date": {"$lt": order_date}},
+            {"order_date": order_date, "_id": {"$lt": order_id}},
+        ]
+    }
+
+
+def build_product_snapshot(product):
+    # Compact copy of the product stored on each order item at write time
+    return {
+        "name": product.get("name", ""),
+        "image_url": product.get("image_url", ""),
+        "category": product.get("category", ""),
+    }
+
+
+def collect_product_ids(orders):
+    # Only items written before snapshots existed still need a product lookup
+    product_ids = set()
+    for order in orders:
+        for item in order.get("items", []):
+            if item and item.get("product_id") and not item.get("product"):
+                product_ids.add(item["product_id"])
+    return product_ids
+
+
+async def format_order_responses(orders):
+    # At most one $in query for legacy items on the page
+    products_map = await get_products_by_ids(collect_product_ids(orders))
+    return [await format_order_response(order, products_map) for order in orders]
+
+
+async def format_order_response(order, products_map=None):
+    if products_map is None:
+        products_map = await get_products_by_ids(collect_product_ids([order]))
+
     # Get product details for each item
     items_with_products = []
 
     for item in order["items"]:
-        product = await products_collection.find_one(
-            {"_id": ObjectId(item["product_id"])}
-        )
-        if product:
-            product = serialize_doc_id(product)
+        snapshot = item.get("product")
+        if not snapshot and item["product_id"] in products_map:
+            snapshot = build_product_snapshot(products_map[item["product_id"]])
+        if snapshot:
             item_response = {
                 "product_id": item["product_id"],
                 "quantity": item["quantity"],
                 "price_at_purchase": item["price_at_purchase"],
-                "product": ProductResponse(**product),
+                "product": OrderProductResponse(id=item["product_id"], **snapshot),
             }
             
             # Include selected option if present
@@ -740,4 +1611,4 @@ async def format_order_response(order):
         payment_status=order["payment_status"],
     )
 
-    return order_response
\ No newline at end of file
+    return order_response
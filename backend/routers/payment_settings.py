@@ -1,5 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Response
+from typing import Dict, Any, Optional
 
 from models import (
     UserInDB, 
@@ -10,14 +10,23 @@ from database import (
     get_payment_settings,
     update_payment_settings
 )
+from http_cache import make_etag, etag_matches, cache_headers, PAYMENT_SETTINGS_CACHE_CONTROL
 from routers.auth import get_current_user
 
 router = APIRouter()
 
 @router.get("/payment-settings", response_model=PaymentSettingsResponse)
-async def get_settings():
+async def get_settings(response: Response, if_none_match: Optional[str] = Header(None)):
     """Get payment settings - public endpoint for customers to see payment details"""
     settings = await get_payment_settings()
+
+    # The settings document carries a version that every update bumps
+    etag = make_etag("payment-settings", settings.get("id"), settings.get("version", 0))
+    headers = cache_headers(etag, PAYMENT_SETTINGS_CACHE_CONTROL)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
     return settings
 
 @router.get("/admin/payment-settings", response_model=PaymentSettingsResponse)
@@ -1,17 +1,91 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Query, File, UploadFile, Request, Response
+from typing import List, Optional, Union
 from bson import ObjectId
-from models import ProductCreate, ProductResponse, ProductUpdate, UserInDB
-from database import products_collection, serialize_doc_id, serialize_list
+from bson.errors import InvalidId
+from pydantic import TypeAdapter, ValidationError
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+import base64
+import io
+import json
+import zipfile
+import pandas as pd
+from models import (
+    ProductCreate,
+    ProductResponse,
+    ProductCardResponse,
+    ProductUpdate,
+    ProductBatchRequest,
+    ProductBatchResponse,
+    ProductSearchResult,
+    ProductImportReport,
+    ProductImageResponse,
+    UserInDB,
+)
+from database import (
+    products_collection,
+    serialize_doc_id,
+    serialize_list,
+    get_products_by_ids,
+    refresh_product_prices,
+    refresh_all_product_prices,
+    parse_price,
+)
+from product_cache import (
+    cached_products,
+    product_cache_key,
+    invalidate_product_cache,
+    get_product_cache_stats,
+)
+from product_search import search_products, index_product, remove_product, rebuild_search_index
+from product_images import store_product_image, PRODUCT_IMAGE_MAX_BYTES
+from http_cache import make_etag, conditional_json_response, PRODUCTS_CACHE_CONTROL
 from routers.auth import get_current_user
 
 router = APIRouter()
 
+PRODUCT_LIST_ADAPTER = TypeAdapter(List[ProductResponse])
+PRODUCT_ADAPTER = TypeAdapter(ProductResponse)
+PRODUCT_CARD_LIST_ADAPTER = TypeAdapter(List[ProductCardResponse])
+PRODUCT_IMPORT_MAX_ROWS = 5000
+PRICE_BACKFILL_BATCH_SIZE = 500
+ADMIN_PRODUCTS_PAGE_SIZE = 500
 
-@router.get("/products", response_model=List[ProductResponse])
+# Admin sort keys -> product fields
+ADMIN_PRODUCT_SORT_FIELDS = {
+    "name": "name",
+    "price": "price",
+    "stock": "stock_quantity",
+    "category": "category",
+}
+
+# Mongo projection matching ProductCardResponse
+PRODUCT_CARD_PROJECTION = {
+    field: 1 for field in ProductCardResponse.model_fields if field != "id"
+}
+PRODUCT_BATCH_MAX_IDS = 200
+
+
+@router.get(
+    "/products",
+    response_model=Union[List[ProductResponse], List[ProductCardResponse]],
+)
 async def get_all_products(
-    category: Optional[str] = None, status: Optional[str] = None, seasonal: Optional[bool] = None
+    category: Optional[str] = None,
+    status: Optional[str] = None,
+    seasonal: Optional[bool] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    sort: Optional[str] = Query(None, pattern="^(price|name)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    view: str = Query("full", pattern="^(full|card)$"),
+    if_none_match: Optional[str] = Header(None),
 ):
+    """
+    view=card returns only the fields a product grid needs.
+    Prices filter and sort on the derived min_price/max_price, so a product
+    with price options matches if any of its options is within the range.
+    """
     # Filter products by category, status and seasonal flag if provided
     filter_query = {}
     if category:
@@ -26,33 +100,176 @@ async def get_all_products(
     if seasonal is not None:
         filter_query["is_seasonal"] = seasonal
 
-    products = await products_collection.find(filter_query).to_list(1000)
-    return serialize_list(products)
+    # Price range overlaps the product's cheapest to dearest option
+    if min_price is not None:
+        filter_query["max_price"] = {"$gte": min_price}
+    if max_price is not None:
+        filter_query["min_price"] = {"$lte": max_price}
+
+    # Price sorts on the "from" price shown on product cards
+    sort_spec = None
+    if sort:
+        direction = 1 if order == "asc" else -1
+        sort_spec = [("min_price" if sort == "price" else "name", direction), ("_id", direction)]
+
+    async def load_products():
+        projection = PRODUCT_CARD_PROJECTION if view == "card" else None
+        cursor = products_collection.find(filter_query, projection)
+        if sort_spec:
+            cursor = cursor.sort(sort_spec)
+        products = serialize_list(await cursor.to_list(1000))
+        adapter = PRODUCT_CARD_LIST_ADAPTER if view == "card" else PRODUCT_LIST_ADAPTER
+        return encode_products(adapter, products)
+
+    key = product_cache_key(
+        "products", category, filter_query["status"], seasonal,
+        min_price, max_price, sort, order if sort else None, view,
+    )
+    cached = await cached_products(key, load_products)
+    return conditional_json_response(
+        cached["body"], cached["etag"], if_none_match, PRODUCTS_CACHE_CONTROL
+    )
+
+
+@router.get("/products/search", response_model=List[ProductSearchResult])
+async def search_product_catalog(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+):
+    """Autocomplete over active products, answered from the in-memory index"""
+    return search_products(q, limit)
+
+
+@router.post("/products/batch", response_model=ProductBatchResponse)
+async def get_products_batch(batch: ProductBatchRequest):
+    """Resolve many products with one $in query, in the order requested"""
+    if len(batch.ids) > PRODUCT_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {PRODUCT_BATCH_MAX_IDS} product ids per request",
+        )
+
+    # Drop repeated ids but keep the first position of each
+    product_ids = list(dict.fromkeys(batch.ids))
+    products_map = await get_products_by_ids(product_ids)
+    return {
+        "products": [products_map[pid] for pid in product_ids if pid in products_map],
+        "missing": [pid for pid in product_ids if pid not in products_map],
+    }
 
 
 @router.get("/products/{product_id}", response_model=ProductResponse)
-async def get_product(product_id: str):
-    product = await products_collection.find_one({"_id": ObjectId(product_id)})
-    if not product:
+async def get_product(product_id: str, if_none_match: Optional[str] = Header(None)):
+    async def load_product():
+        product = await products_collection.find_one({"_id": ObjectId(product_id)})
+        if not product:
+            return None
+        return encode_products(PRODUCT_ADAPTER, serialize_doc_id(product))
+
+    cached = await cached_products(product_cache_key("product", product_id), load_product)
+    if not cached:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Product not found"
         )
-    return serialize_doc_id(product)
+    return conditional_json_response(
+        cached["body"], cached["etag"], if_none_match, PRODUCTS_CACHE_CONTROL
+    )
+
+
+def encode_products(adapter, data):
+    # Validate and encode once per cache fill; hits reuse the bytes and their ETag
+    body = adapter.dump_json(adapter.validate_python(data))
+    return {"body": body, "etag": make_etag(body)}
+
+
+@router.get("/admin/products/cache")
+async def get_product_cache(current_user: UserInDB = Depends(get_current_user)):
+    """Hit and miss counters of the storefront product cache"""
+    # Check if user is admin
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized"
+        )
+    return get_product_cache_stats()
 
 
 @router.get("/admin/products", response_model=List[ProductResponse])
-async def get_admin_products(current_user: UserInDB = Depends(get_current_user)):
+async def get_admin_products(
+    response: Response,
+    sort: str = Query("name", pattern="^(name|price|stock|category)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    is_seasonal: Optional[bool] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(ADMIN_PRODUCTS_PAGE_SIZE, ge=1, le=ADMIN_PRODUCTS_PAGE_SIZE),
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """
+    List products of any status one page at a time.
+    The cursor for the next page is returned in the X-Next-Cursor header
+    and is absent on the last page.
+    """
     # Check if user is admin
     if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized"
         )
-    # Retrieve all products, regardless of status
-    cursor = products_collection.find({})
-    products = await cursor.to_list(length=100)
-    # Serialize the MongoDB documents
-    serialized_products = [serialize_doc_id(product) for product in products]
-    return serialized_products
+
+    filter_query = {}
+    if status_filter:
+        filter_query["status"] = status_filter
+    if is_seasonal is not None:
+        filter_query["is_seasonal"] = is_seasonal
+
+    # Keyset pagination on (sort field, _id)
+    field = ADMIN_PRODUCT_SORT_FIELDS[sort]
+    direction = 1 if order == "asc" else -1
+    if cursor:
+        filter_query = {"$and": [filter_query, product_cursor_filter(cursor, sort, order)]}
+
+    # Fetch one extra product to know whether another page exists
+    products = (
+        await products_collection.find(filter_query)
+        .sort([(field, direction), ("_id", direction)])
+        .limit(limit + 1)
+        .to_list(limit + 1)
+    )
+    if len(products) > limit:
+        products = products[:limit]
+        response.headers["X-Next-Cursor"] = encode_product_cursor(products[-1], sort, order)
+
+    return serialize_list(products)
+
+
+def encode_product_cursor(product, sort, order):
+    # Opaque cursor pointing at the last product of a page, tied to its ordering
+    raw = json.dumps([sort, order, product.get(ADMIN_PRODUCT_SORT_FIELDS[sort]), str(product["_id"])])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def product_cursor_filter(cursor, sort, order):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        cursor_sort, cursor_order, value, product_id = json.loads(raw)
+        product_id = ObjectId(product_id)
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+    if (cursor_sort, cursor_order) != (sort, order):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor was issued for a different sort order",
+        )
+
+    field = ADMIN_PRODUCT_SORT_FIELDS[sort]
+    op = "$gt" if order == "asc" else "$lt"
+    return {
+        "$or": [
+            {field: {op: value}},
+            {field: value, "_id": {op: product_id}},
+        ]
+    }
 
 
 @router.post("/admin/products", response_model=ProductResponse)
@@ -64,10 +281,16 @@ async def create_product(
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized"
         )
+    check_price_options(product.price_options)
     product_dict = product.dict()
     result = await products_collection.insert_one(product_dict)
-    new_product = await products_collection.find_one({"_id": result.inserted_id})
-    return serialize_doc_id(new_product)
+    await refresh_product_prices([result.inserted_id])
+    invalidate_product_cache()
+    new_product = serialize_doc_id(
+        await products_collection.find_one({"_id": result.inserted_id})
+    )
+    index_product(new_product)
+    return new_product
 
 
 @router.put("/admin/products/{product_id}", response_model=ProductResponse)
@@ -87,6 +310,7 @@ async def update_product(
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Product not found"
         )
+    check_price_options(product.price_options)
     # Update product
     update_data = {k: v for k, v in product.dict().items() if v is not None}
     # Handle case when old_price is explicitly set to None to remove it
@@ -100,8 +324,38 @@ async def update_product(
         await products_collection.update_one(
             {"_id": ObjectId(product_id)}, {"$set": update_data}
         )
-    updated_product = await products_collection.find_one({"_id": ObjectId(product_id)})
-    return serialize_doc_id(updated_product)
+    await refresh_product_prices([product_id])
+    invalidate_product_cache()
+    updated_product = serialize_doc_id(
+        await products_collection.find_one({"_id": ObjectId(product_id)})
+    )
+    index_product(updated_product)
+    return updated_product
+
+
+def price_option_errors(price_options):
+    # price_options is untyped, so check what derived prices rely on
+    errors = []
+    for index, option in enumerate(price_options or []):
+        label = f"price_options[{index}]"
+        if not isinstance(option, dict):
+            errors.append(f"{label} must be an object")
+            continue
+        for field in ("type", "size"):
+            value = option.get(field)
+            if isinstance(value, (dict, list)) or is_blank(value):
+                errors.append(f"{label}.{field} is required")
+        if parse_price(option.get("price")) is None:
+            errors.append(f"{label}.price must be a number")
+    return errors
+
+
+def check_price_options(price_options):
+    errors = price_option_errors(price_options)
+    if errors:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="; ".join(errors)
+        )
 
 
 @router.delete("/admin/products/{product_id}", response_model=dict)
@@ -121,9 +375,259 @@ async def delete_product(
         )
     # Delete product
     await products_collection.delete_one({"_id": ObjectId(product_id)})
+    await refresh_product_prices([product_id])
+    invalidate_product_cache()
+    remove_product(product_id)
     return {"message": "Product deleted successfully"}
 
 
+@router.post("/admin/products/images", response_model=ProductImageResponse)
+async def upload_product_image(
+    request: Request,
+    file: UploadFile = File(...),
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """Store an uploaded image and its WebP thumbnails for use as a product image"""
+    # Check if user is admin
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized"
+        )
+
+    content = await file.read(PRODUCT_IMAGE_MAX_BYTES + 1)
+    if len(content) > PRODUCT_IMAGE_MAX_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Images must be at most {PRODUCT_IMAGE_MAX_BYTES // (1024 * 1024)} MB",
+        )
+
+    try:
+        image_id, original_name, thumbnails = await store_product_image(content)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    image_thumbnails = {
+        width: str(request.url_for("product_images", path=name))
+        for width, name in thumbnails.items()
+    }
+    return {
+        "id": image_id,
+        "image_url": image_thumbnails[max(thumbnails, key=int)],
+        "original_url": str(request.url_for("product_images", path=f"originals/{original_name}")),
+        "image_thumbnails": image_thumbnails,
+    }
+
+
+@router.post("/admin/products/import", response_model=ProductImportReport)
+async def import_products(
+    file: UploadFile = File(...),
+    dry_run: bool = False,
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """
+    Create or update products from a CSV or Excel sheet in one bulk write.
+    Rows with an id update that product (blank cells are left unchanged),
+    rows without one are created. price_options may be a JSON column, or for
+    Excel a "price_options" sheet with product, type, size, quantity and price
+    columns where product is the id or name of a row in the first sheet.
+    """
+    # Check if user is admin
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized"
+        )
+
+    rows = read_product_sheet(file.filename or "", await file.read())
+    if len(rows) > PRODUCT_IMPORT_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {PRODUCT_IMPORT_MAX_ROWS} rows per import",
+        )
+
+    # Updates must target existing products, checked with one $in query
+    update_ids = [row["id"] for _, row in rows if row.get("id") and ObjectId.is_valid(row["id"])]
+    existing_ids = {
+        str(product["_id"])
+        for product in await products_collection.find(
+            {"_id": {"$in": [ObjectId(product_id) for product_id in update_ids]}}, {"_id": 1}
+        ).to_list(None)
+    }
+
+    report, operations, operation_rows = [], [], []
+    for row_number, row in rows:
+        result = {"row": row_number, "status": "valid", "id": row.get("id"), "errors": []}
+        report.append(result)
+        try:
+            operation, result["id"] = build_import_operation(row, existing_ids)
+        except ValidationError as e:
+            result["status"] = "error"
+            result["errors"] = [
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                for error in e.errors()
+            ]
+            continue
+        except ValueError as e:
+            result["status"] = "error"
+            result["errors"] = [str(arg) for arg in e.args]
+            continue
+        if dry_run and isinstance(operation, InsertOne):
+            # Nothing is created, so there is no id to report yet
+            result["id"] = None
+        operations.append(operation)
+        operation_rows.append(result)
+
+    if operations and not dry_run:
+        write_errors = {}
+        try:
+            await products_collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            write_errors = {error["index"]: error["errmsg"] for error in e.details["writeErrors"]}
+
+        for index, result in enumerate(operation_rows):
+            if index in write_errors:
+                result["status"] = "error"
+                result["errors"] = [write_errors[index]]
+            else:
+                result["status"] = "created" if isinstance(operations[index], InsertOne) else "updated"
+
+        await refresh_product_prices(
+            [result["id"] for result in operation_rows if result["status"] != "error"]
+        )
+        invalidate_product_cache()
+        await rebuild_search_index()
+
+    return {
+        "created": sum(1 for result in report if result["status"] == "created"),
+        "updated": sum(1 for result in report if result["status"] == "updated"),
+        "failed": sum(1 for result in report if result["status"] == "error"),
+        "dry_run": dry_run,
+        "rows": report,
+    }
+
+
+def read_product_sheet(filename: str, content: bytes):
+    """Parse an uploaded sheet into (row number, {column: value}) with blanks dropped"""
+    try:
+        if filename.lower().endswith(".csv"):
+            frames = {"products": pd.read_csv(io.BytesIO(content), dtype=str)}
+        elif filename.lower().endswith(".xlsx"):
+            frames = pd.read_excel(
+                io.BytesIO(content), sheet_name=None, dtype=object, engine="openpyxl"
+            )
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Upload a .csv or .xlsx file",
+            )
+    # Corrupt or mislabelled workbooks fail inside openpyxl's zip reader
+    except (ValueError, UnicodeDecodeError, ImportError, zipfile.BadZipFile) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"Could not read file: {str(e)}"
+        )
+
+    options_frame = frames.pop("price_options", None)
+    if not frames:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="No product sheet found"
+        )
+    products_frame = next(iter(frames.values()))
+
+    rows = []
+    for index, record in enumerate(sheet_records(products_frame)):
+        if "id" in record:
+            record["id"] = str(record["id"]).strip()
+        # Row 1 is the header
+        rows.append((index + 2, record))
+
+    if options_frame is not None:
+        attach_price_options(rows, sheet_records(options_frame))
+    return rows
+
+
+def sheet_records(frame):
+    frame.columns = [str(column).strip().lower() for column in frame.columns]
+    return [
+        {column: value for column, value in record.items() if not is_blank(value)}
+        for record in frame.to_dict(orient="records")
+    ]
+
+
+def is_blank(value):
+    if isinstance(value, str):
+        return not value.strip()
+    return value is None or pd.isna(value)
+
+
+def attach_price_options(rows, option_records):
+    # Options reference their product by id, or by name for new products
+    by_key = {}
+    for _, row in rows:
+        for key in (row.get("id"), row.get("name")):
+            if key:
+                by_key.setdefault(str(key).strip(), row)
+
+    for record in option_records:
+        row = by_key.get(str(record.pop("product", "")).strip())
+        if row is None:
+            continue
+        if isinstance(row.get("price_options"), str):
+            row["price_options_error"] = "price_options given both as a column and a sheet"
+            continue
+        row.setdefault("price_options", []).append(record)
+
+
+def build_import_operation(row, existing_ids):
+    """Validate one sheet row and turn it into an InsertOne or UpdateOne plus its product id"""
+    if "price_options_error" in row:
+        raise ValueError(row["price_options_error"])
+
+    data = {key: value for key, value in row.items() if key != "id"}
+    if isinstance(data.get("price_options"), str):
+        try:
+            data["price_options"] = json.loads(data["price_options"])
+        except json.JSONDecodeError:
+            raise ValueError("price_options is not valid JSON")
+    if data.get("price_options") and "has_price_options" not in data:
+        data["has_price_options"] = True
+
+    product_id = row.get("id")
+    if not product_id:
+        product = ProductCreate(**data).dict()
+        check_import_price_options(product["price_options"])
+        product["_id"] = ObjectId()
+        return InsertOne(product), str(product["_id"])
+
+    if not ObjectId.is_valid(product_id) or product_id not in existing_ids:
+        raise ValueError(f"Product {product_id} not found")
+    update_data = {k: v for k, v in ProductUpdate(**data).dict().items() if v is not None}
+    if not update_data:
+        raise ValueError("Nothing to update")
+    check_import_price_options(update_data.get("price_options"))
+    return UpdateOne({"_id": ObjectId(product_id)}, {"$set": update_data}), product_id
+
+
+def check_import_price_options(price_options):
+    # One ValueError argument per problem, reported as that row's errors
+    errors = price_option_errors(price_options)
+    if errors:
+        raise ValueError(*errors)
+
+
+# Compute derived prices for products written before they existed (migration helper)
+@router.post("/admin/products/backfill-prices", include_in_schema=False)
+async def backfill_product_prices(current_user: UserInDB = Depends(get_current_user)):
+    # Check if user is admin
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized"
+        )
+
+    product_count = await refresh_all_product_prices(batch_size=PRICE_BACKFILL_BATCH_SIZE)
+    invalidate_product_cache()
+
+    return {"message": f"Backfilled prices on {product_count} products"}
+
+
 # Update the products to new format (migration helper)
 @router.post("/admin/update-mango-products", include_in_schema=False)
 async def update_mango_products(current_user: UserInDB = Depends(get_current_user)):
@@ -226,6 +730,9 @@ async def update_mango_products(current_user: UserInDB = Depends(get_current_use
         {"category": {"$ne": "mangoes"}},
         {"$set": {"is_seasonal": False}}
     )
+    await refresh_product_prices([product["_id"] for product in mango_products])
+    invalidate_product_cache()
+    await rebuild_search_index()
     
     return {"message": f"Updated {updated_count} mango products"}
 
@@ -351,6 +858,9 @@ async def seed_products():
         },
     ]
     result = await products_collection.insert_many(products)
+    await refresh_product_prices(result.inserted_ids)
+    invalidate_product_cache()
+    await rebuild_search_index()
     return {"message": f"{len(result.inserted_ids)} products created successfully"}
 
 # Update the products to new format (migration helper)
@@ -455,5 +965,8 @@ async def update_mango_products(current_user: UserInDB = Depends(get_current_use
         {"category": {"$ne": "mangoes"}},
         {"$set": {"is_seasonal": False}}
     )
+    await refresh_product_prices([product["_id"] for product in mango_products])
+    invalidate_product_cache()
+    await rebuild_search_index()
     
     return {"message": f"Updated {updated_count} mango products"}
\ No newline at end of file
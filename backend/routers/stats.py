@@ -0,0 +1,131 @@
+# backend/routers/stats.py
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional, List
+from datetime import datetime
+from collections import defaultdict
+
+from models import StatsResponse, DailyStats, IndexUsage, UserInDB
+from database import (
+    orders_collection,
+    orders_archive_collection,
+    stats_daily_collection,
+    stats_day,
+    apply_order_stats,
+    get_index_usage,
+    STATS_PROJECTION,
+)
+from routers.auth import get_current_user
+
+router = APIRouter()
+
+STATS_REBUILD_BATCH_SIZE = 1000
+
+
+@router.get("/admin/stats", response_model=StatsResponse)
+async def get_stats(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """Dashboard counters read from the stats_daily rollup, one document per day"""
+    # Check if user is admin
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized"
+        )
+
+    # Days are keyed by their date, so the range is an _id range
+    filter_query = {}
+    if start_date or end_date:
+        filter_query["_id"] = {}
+        if start_date:
+            filter_query["_id"]["$gte"] = stats_day(start_date)
+        if end_date:
+            filter_query["_id"]["$lte"] = stats_day(end_date)
+
+    days = await stats_daily_collection.find(filter_query).sort("_id", 1).to_list(None)
+
+    # Sum the days into overall totals
+    totals = {
+        "orders": 0,
+        "revenue": 0,
+        "order_status": defaultdict(int),
+        "payment_status": defaultdict(int),
+        "units": defaultdict(int),
+    }
+    daily_stats = []
+    for day in days:
+        totals["orders"] += day.get("orders", 0)
+        totals["revenue"] += day.get("revenue", 0)
+        for field in ("order_status", "payment_status", "units"):
+            for key, value in day.get(field, {}).items():
+                totals[field][key] += value
+
+        daily_stats.append(
+            DailyStats(
+                date=day["_id"],
+                orders=day.get("orders", 0),
+                revenue=day.get("revenue", 0),
+                order_status=non_zero(day.get("order_status", {})),
+                payment_status=non_zero(day.get("payment_status", {})),
+                units=non_zero(day.get("units", {})),
+            )
+        )
+
+    return StatsResponse(
+        orders=totals["orders"],
+        revenue=totals["revenue"],
+        order_status=non_zero(totals["order_status"]),
+        payment_status=non_zero(totals["payment_status"]),
+        units=non_zero(totals["units"]),
+        days=daily_stats,
+    )
+
+
+def non_zero(counters):
+    # Counters decremented back to zero stay in the rollup documents
+    return {key: value for key, value in counters.items() if value}
+
+
+# Rebuild the rollup from the orders collection (migration helper)
+@router.post("/admin/stats/rebuild", include_in_schema=False)
+async def rebuild_stats(current_user: UserInDB = Depends(get_current_user)):
+    # Check if user is admin
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized"
+        )
+
+    await stats_daily_collection.delete_many({})
+
+    # Archived orders still count towards the dashboard
+    order_count = 0
+    for collection in (orders_collection, orders_archive_collection):
+        cursor = collection.find({}, STATS_PROJECTION).batch_size(
+            STATS_REBUILD_BATCH_SIZE
+        )
+
+        batch = []
+        async for order in cursor:
+            batch.append((order, 1))
+            order_count += 1
+            if len(batch) >= STATS_REBUILD_BATCH_SIZE:
+                await apply_order_stats(batch)
+                batch = []
+        if batch:
+            await apply_order_stats(batch)
+
+    return {"message": f"Rebuilt dashboard stats from {order_count} orders"}
+
+
+@router.get("/admin/indexes", response_model=List[IndexUsage])
+async def get_indexes(current_user: UserInDB = Depends(get_current_user)):
+    """How often each index was used since the last mongod restart"""
+    # Check if user is admin
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized"
+        )
+
+    return await get_index_usage()
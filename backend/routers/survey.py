@@ -3,6 +3,7 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from typing import List
 from datetime import datetime
+from pymongo.errors import DuplicateKeyError
 
 from models import (
     SurveyProductCreate, 
@@ -44,7 +45,15 @@ async def submit_survey(survey_data: SurveyResponse, current_user: UserInDB = No
         return {"message": "Survey response updated successfully"}
     
     # Create new response
-    result = await create_survey_response(survey_data.dict())
+    try:
+        result = await create_survey_response(survey_data.dict())
+    except DuplicateKeyError:
+        # A concurrent submission for this mobile got there first
+        await survey_responses_collection.update_one(
+            {"mobile": survey_data.mobile},
+            {"$set": {**survey_data.dict(), "created_at": datetime.utcnow()}}
+        )
+        return {"message": "Survey response updated successfully"}
     return {"message": "Survey submitted successfully", "id": str(result["_id"])}
 
 @router.get("/survey/check/{mobile}")
@@ -154,6 +154,12 @@ const ProductCard = ({ product }) => {
 
   const priceInfo = getMinPriceInfo();
 
+  // Uploaded images come with pre-sized WebP thumbnails
+  const thumbnails = Object.entries(product.image_thumbnails || {});
+  const thumbnailSrcSet = thumbnails.length > 0
+    ? thumbnails.map(([width, url]) => `${url} ${width}w`).join(', ')
+    : undefined;
+
   return (
     <>
       <Card 
@@ -164,6 +170,8 @@ const ProductCard = ({ product }) => {
           component="img"
           height="140"
           image={product.image_url}
+          srcSet={thumbnailSrcSet}
+          sizes="(max-width: 640px) 100vw, 320px"
           alt={product.name}
           className="h-48 object-cover"
         />
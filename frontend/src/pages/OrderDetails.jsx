@@ -171,8 +171,8 @@ const OrderDetails = () => {
                       />
                     )}
                   </Box>
-                  <Typography variant="body2" color="text.secondary" paragraph className="line-clamp-2">
-                    {item.product.description}
+                  <Typography variant="body2" color="text.secondary" paragraph className="capitalize">
+                    {item.product.category}
                   </Typography>
                   <Box className="flex justify-between items-center">
                     <Typography variant="body1">
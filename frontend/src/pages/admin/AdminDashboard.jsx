@@ -48,6 +48,7 @@ const AdminDashboard = () => {
         
         // Get products count
         const productsResponse = await api.get('/products', {
+          params: { view: 'card' },
           headers: { Authorization: `Bearer ${token}` }
         });
         
@@ -56,28 +57,32 @@ const AdminDashboard = () => {
           headers: { Authorization: `Bearer ${token}` }
         });
         
-        // Get orders
+        // Get order counters from the daily rollup
+        const statsResponse = await api.get('/admin/stats', {
+          headers: { Authorization: `Bearer ${token}` }
+        });
+        
+        // Get the 5 most recent orders
         const ordersResponse = await api.get('/admin/orders', {
+          params: { limit: 5 },
           headers: { Authorization: `Bearer ${token}` }
         });
         
         // Calculate stats
-        const activeOrders = ordersResponse.data.filter(
-          order => ['pending', 'processing', 'shipped'].includes(order.order_status)
-        );
-        const deliveredOrders = ordersResponse.data.filter(
-          order => order.order_status === 'delivered'
+        const orderStatus = statsResponse.data.order_status;
+        const activeOrders = ['pending', 'processing', 'shipped'].reduce(
+          (count, status) => count + (orderStatus[status] || 0), 0
         );
         
         setStats({
           products: productsResponse.data.length,
           users: usersResponse.data.filter(user => !user.is_admin).length,
-          activeOrders: activeOrders.length,
-          deliveredOrders: deliveredOrders.length
+          activeOrders: activeOrders,
+          deliveredOrders: orderStatus.delivered || 0
         });
         
-        // Set recent orders (up to 5)
-        setRecentOrders(ordersResponse.data.slice(0, 5));
+        // Set recent orders
+        setRecentOrders(ordersResponse.data);
       } catch (error) {
         console.error('Error fetching dashboard data:', error);
       } finally {
@@ -315,7 +320,7 @@ const AdminDashboard = () => {
                             variant="outlined" 
                             size="small"
                             component={Link}
-                            to={`/admin/orders?orderId=${order.id}`}
+                            to={`/admin/orders?orderId=${order.id}&status=${['delivered', 'cancelled'].includes(order.order_status) ? 'past' : 'active'}`}
                           >
                             View
                           </Button>
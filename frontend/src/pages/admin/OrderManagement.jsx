@@ -11,15 +11,26 @@ import {
 import { Link, useSearchParams } from 'react-router-dom';
 import { format } from 'date-fns';
 import api from '../../utils/api';
+import { getAllAdminProducts } from '../../utils/productApi';
+import { getAdminOrdersPage } from '../../utils/orderApi';
 import DeleteIcon from '@mui/icons-material/Delete';
 import EditIcon from '@mui/icons-material/Edit';
 import AddIcon from '@mui/icons-material/Add';
 import RemoveIcon from '@mui/icons-material/Remove';
 import Switch from '@mui/material/Switch';
 
+// Tabs map to the server's status groups; orders load one page at a time
+const ORDER_GROUPS = ['active', 'past'];
+const ACTIVE_STATUSES = ['pending', 'processing', 'shipped'];
+const PAST_STATUSES = ['delivered', 'cancelled'];
+const ORDERS_PAGE_SIZE = 100;
+
 const OrderManagement = () => {
   const [searchParams] = useSearchParams();
   const [orders, setOrders] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [orderCounts, setOrderCounts] = useState({ active: 0, past: 0 });
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const [success, setSuccess] = useState('');
@@ -88,16 +99,18 @@ const OrderManagement = () => {
   useEffect(() => {
     // Check URL parameters for specific tab
     const statusParam = searchParams.get('status');
+    let tab = tabValue;
     if (statusParam === 'active') {
-      setTabValue(0);
+      tab = 0;
     } else if (statusParam === 'past') {
-      setTabValue(1);
+      tab = 1;
     }
+    setTabValue(tab);
     
     // Check if a specific order should be viewed
     const orderIdParam = searchParams.get('orderId');
     
-    fetchOrders(orderIdParam);
+    fetchOrders(orderIdParam, tab);
     fetchProducts();
   }, [searchParams]);
   
@@ -125,18 +138,17 @@ const OrderManagement = () => {
     }
   }, [selectedProduct, optionType]);
   
-  const fetchOrders = async (specificOrderId = null) => {
+  // Load the first page of the tab's orders; further pages load on demand
+  const fetchOrders = async (specificOrderId = null, tab = tabValue) => {
     try {
       setLoading(true);
-      const token = localStorage.getItem('token');
-      const response = await api.get('/admin/orders', {
-        headers: {
-          Authorization: `Bearer ${token}`
-        }
+      const { orders: fetchedOrders, nextCursor: cursor } = await getAdminOrdersPage({
+        status: ORDER_GROUPS[tab],
+        limit: ORDERS_PAGE_SIZE
       });
-      
-      const fetchedOrders = response.data;
       setOrders(fetchedOrders);
+      setNextCursor(cursor);
+      fetchOrderCounts();
       
       // If a specific order ID was requested, open it in the view dialog
       if (specificOrderId) {
@@ -155,13 +167,46 @@ const OrderManagement = () => {
     }
   };
   
-  const fetchProducts = async () => {
+  const loadMoreOrders = async () => {
+    try {
+      setLoadingMore(true);
+      const page = await getAdminOrdersPage(
+        { status: ORDER_GROUPS[tabValue], limit: ORDERS_PAGE_SIZE },
+        nextCursor
+      );
+      setOrders(prev => [...prev, ...page.orders]);
+      setNextCursor(page.nextCursor);
+    } catch (err) {
+      setError('Failed to load more orders. Please try again.');
+      console.error('Error loading more orders:', err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+  
+  // Tab counts come from the dashboard rollup instead of the loaded pages
+  const fetchOrderCounts = async () => {
     try {
       const token = localStorage.getItem('token');
-      const response = await api.get('/admin/products', {
+      const response = await api.get('/admin/stats', {
         headers: { Authorization: `Bearer ${token}` }
       });
-      setProducts(response.data);
+      const orderStatus = response.data.order_status;
+      const countStatuses = (statuses) => statuses.reduce(
+        (count, status) => count + (orderStatus[status] || 0), 0
+      );
+      setOrderCounts({
+        active: countStatuses(ACTIVE_STATUSES),
+        past: countStatuses(PAST_STATUSES)
+      });
+    } catch (err) {
+      console.error('Error fetching order counts:', err);
+    }
+  };
+  
+  const fetchProducts = async () => {
+    try {
+      setProducts(await getAllAdminProducts());
     } catch (err) {
       console.error('Error fetching products:', err);
     }
@@ -171,6 +216,7 @@ const OrderManagement = () => {
     setTabValue(newValue);
     // Clear selections when changing tabs
     setSelectedOrderIds([]);
+    fetchOrders(null, newValue);
   };
   
   // New function to handle checkbox selection
@@ -583,16 +629,8 @@ const OrderManagement = () => {
     }
   };
   
-  // Filter orders based on tab
-  const activeOrders = orders.filter(order => 
-    ['pending', 'processing', 'shipped'].includes(order.order_status)
-  );
-  
-  const pastOrders = orders.filter(order => 
-    ['delivered', 'cancelled'].includes(order.order_status)
-  );
-  
-  const displayOrders = tabValue === 0 ? activeOrders : pastOrders;
+  // The server already filtered the loaded pages by the tab's status group
+  const displayOrders = orders;
 
   // Determine if some or all orders are selected
   const numSelected = selectedOrderIds.length;
@@ -624,8 +662,8 @@ const OrderManagement = () => {
           textColor="primary"
           centered
         >
-          <Tab label={`Active Orders (${activeOrders.length})`} />
-          <Tab label={`Past Orders (${pastOrders.length})`} />
+          <Tab label={`Active Orders (${orderCounts.active})`} />
+          <Tab label={`Past Orders (${orderCounts.past})`} />
         </Tabs>
       </Paper>
       
@@ -771,6 +809,14 @@ const OrderManagement = () => {
         </TableContainer>
       )}
       
+      {!loading && nextCursor && (
+        <Box display="flex" justifyContent="center" mt={2}>
+          <Button variant="outlined" onClick={loadMoreOrders} disabled={loadingMore}>
+            {loadingMore ? <CircularProgress size={24} /> : 'Load More Orders'}
+          </Button>
+        </Box>
+      )}
+      
       {/* View Order Dialog */}
       <Dialog 
         open={viewDialogOpen} 
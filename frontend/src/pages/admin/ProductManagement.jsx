@@ -13,6 +13,7 @@ import DeleteIcon from '@mui/icons-material/Delete';
 import AddIcon from '@mui/icons-material/Add';
 import ExpandMoreIcon from '@mui/icons-material/ExpandMore';
 import api from '../../utils/api';
+import { getAllAdminProducts } from '../../utils/productApi';
 
 const ProductManagement = () => {
   const [products, setProducts] = useState([]);
@@ -31,6 +32,7 @@ const ProductManagement = () => {
     stock_quantity: '',
     category: '',
     image_url: '',
+    image_thumbnails: {},
     status: '',
     is_seasonal: false,
     has_price_options: false,
@@ -38,6 +40,7 @@ const ProductManagement = () => {
   });
   const [formErrors, setFormErrors] = useState({});
   const [isSubmitting, setIsSubmitting] = useState(false);
+  const [uploadingImage, setUploadingImage] = useState(false);
   
   // Delete confirmation dialog
   const [deleteDialogOpen, setDeleteDialogOpen] = useState(false);
@@ -111,13 +114,7 @@ const ProductManagement = () => {
   const fetchProducts = async () => {
     try {
       setLoading(true);
-      const token = localStorage.getItem('token');
-      const response = await api.get('/admin/products', {
-        headers: {
-          Authorization: `Bearer ${token}`
-        }
-      });
-      setProducts(response.data);
+      setProducts(await getAllAdminProducts());
       setError('');
     } catch (err) {
       setError('Failed to fetch products. Please try again.');
@@ -139,6 +136,7 @@ const ProductManagement = () => {
         stock_quantity: product.stock_quantity.toString(),
         category: product.category,
         image_url: product.image_url,
+        image_thumbnails: product.image_thumbnails || {},
         status: product.status,
         is_seasonal: product.is_seasonal || false,
         has_price_options: product.has_price_options || false,
@@ -153,6 +151,7 @@ const ProductManagement = () => {
         stock_quantity: '',
         category: '',
         image_url: '',
+        image_thumbnails: {},
         status: 'active',
         is_seasonal: false,
         has_price_options: false,
@@ -206,10 +205,19 @@ const ProductManagement = () => {
       }
     }
     
-    setFormData({
-      ...formData,
-      [name]: newValue
-    });
+    // A typed image URL has no uploaded thumbnails
+    if (name === 'image_url') {
+      setFormData({
+        ...formData,
+        image_url: value,
+        image_thumbnails: {}
+      });
+    } else {
+      setFormData({
+        ...formData,
+        [name]: newValue
+      });
+    }
     
     // Clear the error for this field
     if (formErrors[name]) {
@@ -220,6 +228,39 @@ const ProductManagement = () => {
     }
   };
   
+  const handleImageUpload = async (e) => {
+    const file = e.target.files[0];
+    e.target.value = '';
+    if (!file) return;
+    
+    setUploadingImage(true);
+    setError('');
+    
+    try {
+      const token = localStorage.getItem('token');
+      const data = new FormData();
+      data.append('file', file);
+      
+      const response = await api.post('/admin/products/images', data, {
+        headers: {
+          Authorization: `Bearer ${token}`,
+          'Content-Type': 'multipart/form-data'
+        }
+      });
+      
+      setFormData(prev => ({
+        ...prev,
+        image_url: response.data.image_url,
+        image_thumbnails: response.data.image_thumbnails
+      }));
+      setFormErrors(prev => ({ ...prev, image_url: '' }));
+    } catch (err) {
+      setError(`Failed to upload image: ${err.response?.data?.detail || err.message}`);
+    } finally {
+      setUploadingImage(false);
+    }
+  };
+  
   const handlePriceOptionChange = (index, field, value) => {
     const updatedOptions = [...formData.price_options];
     
@@ -659,6 +700,17 @@ const ProductManagement = () => {
                 helperText={formErrors.image_url}
                 required
               />
+              <Button
+                component="label"
+                variant="outlined"
+                size="small"
+                className="mt-2"
+                disabled={uploadingImage}
+                startIcon={uploadingImage ? <CircularProgress size={16} /> : null}
+              >
+                Upload Image
+                <input type="file" accept="image/*" hidden onChange={handleImageUpload} />
+              </Button>
             </Grid>
             
             <Grid item xs={12} sm={6}>
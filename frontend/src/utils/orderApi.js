@@ -0,0 +1,16 @@
+// frontend/src/utils/orderApi.js
+import api from './api';
+
+// Admin order listing is paginated; X-Next-Cursor points at the next page
+// and is absent on the last one
+export const getAdminOrdersPage = async (params = {}, cursor = null) => {
+  const token = localStorage.getItem('token');
+  const response = await api.get('/admin/orders', {
+    params: { ...params, ...(cursor ? { cursor } : {}) },
+    headers: { Authorization: `Bearer ${token}` }
+  });
+  return {
+    orders: response.data,
+    nextCursor: response.headers['x-next-cursor'] || null
+  };
+};
@@ -0,0 +1,20 @@
+// frontend/src/utils/productApi.js
+import api from './api';
+
+// Admin product listing is paginated; follow X-Next-Cursor until the last page
+export const getAllAdminProducts = async (params = {}) => {
+  const token = localStorage.getItem('token');
+  const products = [];
+  let cursor = null;
+
+  do {
+    const response = await api.get('/admin/products', {
+      params: { ...params, ...(cursor ? { cursor } : {}) },
+      headers: { Authorization: `Bearer ${token}` }
+    });
+    products.push(...response.data);
+    cursor = response.headers['x-next-cursor'];
+  } while (cursor);
+
+  return products;
+};